@@ -0,0 +1,248 @@
+"""
+Offline benchmarks of tse_index hot paths
+
+Requests are answered by ReplaySession from a recorded fixture, or from a
+synthetic market generated in memory, so results do not depend on network
+and can be compared between commits.
+
+    python benchmarks/bench.py --symbols 1 100 3000
+    python benchmarks/bench.py --fixture market.json.gz
+
+Each benchmark reports best time of repeats, throughput and peak memory
+traced by tracemalloc in a separate run. Import time is measured in a
+fresh interpreter per repeat.
+"""
+import argparse
+import gc
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import tse_index as tse  # noqa: E402
+from tse_index._resample import _resample_frames  # noqa: E402
+from tse_index._transport import Fixture, ReplaySession  # noqa: E402
+
+
+def synthetic_fixture(symbols=3000, days=500, seed=0):
+    """
+    Build a Fixture of stocks with random walk prices
+
+    About one in 250 days of each stock has a capital increase, so price
+    adjustment has work to do.
+    """
+    rng = np.random.default_rng(seed)
+    dates = np.datetime_as_string(
+        np.busday_offset("2015-01-01", np.arange(days), roll="forward",
+                         weekmask="Sat Sun Mon Tue Wed"),
+    )
+    dates = [d.replace("-", "") for d in dates]
+    fixture = Fixture()
+    instruments = []
+    for i in range(symbols):
+        insCode = 1000 + i
+        instruments.append(
+            f"{insCode},IRO1S{i:04d}0001,S{i:04d}1,Sym{i},S{i:04d},نماد{i},"
+            f"شرکت {i},IRO1S{i:04d}0000,{dates[-1]},1,شرکت {i},300,N1,NO,,"
+            "Z1,Z111,A"
+        )
+        close = np.round(1000 * np.exp(np.cumsum(rng.normal(0, 0.02, days))))
+        yesterday = np.concatenate(([close[0]], close[:-1]))
+        events = rng.random(days) < 1 / 250
+        yesterday[events] = np.round(yesterday[events] * 0.8)
+        volume = rng.integers(1000, 100000, days)
+        fixture.closing[str(insCode)] = {
+            d: f"{insCode},{d},{c},{c},10,{v},{v * c},{c},{c},{y},{y}"
+            for d, c, y, v in zip(dates, close, yesterday, volume)
+        }
+    fixture.instruments = ";".join(instruments)
+    fixture.lastPossibleDeven = f"{dates[-1]};{dates[-1]}"
+    return fixture
+
+
+# dependencies which importing tse_index should not load
+HEAVY_MODULES = ("numpy", "pandas", "requests", "jdatetime", "aiohttp", "bs4")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [m for m in sys.argv[2:] if m in sys.modules]]))
+"""
+
+
+def import_time(statement="import tse_index", repeat=3):
+    """
+    Return (best seconds, heavy modules loaded) of statement
+
+    Each repeat runs in a new interpreter so nothing is imported before.
+    """
+    best, loaded = float("inf"), []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT, statement, *HEAVY_MODULES],
+            check=True,
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).resolve().parents[1],
+        ).stdout
+        seconds, loaded = json.loads(output)
+        best = min(best, seconds)
+    return best, loaded
+
+
+def _measure(func, repeat):
+    """Return (best seconds, peak traced bytes, last result) of func"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    del result
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def _reader(fixture):
+    return tse.reader(session=ReplaySession(fixture))
+
+
+def run(fixture, sizes=(1, 100, 3000), repeat=3, interval="w"):
+    """
+    Run benchmarks and return list of result dicts
+
+    Each result has name, n, seconds, rate, unit and peak_mb.
+    """
+    results = []
+
+    def report(name, n, count, unit, measured):
+        seconds, peak, _ = measured
+        results.append({
+            "name": name,
+            "n": n,
+            "seconds": seconds,
+            "rate": count / seconds if seconds else float("inf"),
+            "unit": unit,
+            "peak_mb": peak / 2 ** 20,
+        })
+
+    instruments = _reader(fixture).instruments()
+    report(
+        "instruments", len(instruments), len(instruments), "rows/s",
+        _measure(lambda: _reader(fixture).instruments(), repeat),
+    )
+
+    index = _reader(fixture)
+    index.instruments()
+    queries = [f"نماد{i}" for i in range(0, len(instruments), 97)][:20]
+    index.search(queries[0])
+
+    def search():
+        for query in queries:
+            index.search(query, top=10)
+
+    report(
+        "search", len(instruments), len(queries), "queries/s",
+        _measure(search, repeat),
+    )
+
+    symbols = list(instruments.symbol)
+    for n in sizes:
+        if n > len(symbols):
+            continue
+
+        def history():
+            histories = _reader(fixture).history(
+                symbols[:n], start=20100101, end=20300101
+            )
+            return histories
+
+        measured = _measure(history, repeat)
+        histories = measured[2]
+        rows = sum(len(h) for h in histories.values() if h is not None)
+        report("history", n, rows, "rows/s", measured)
+
+    n = max((s for s in sizes if s <= len(symbols)), default=0)
+    loaded = _reader(fixture)
+    frames = loaded.history(symbols[:n], start=20100101, end=20300101)
+    raw = {s: loaded._history[s] for s in symbols[:n]}
+    rows = sum(len(h) for h in raw.values() if h is not None)
+
+    def adjust():
+        return [loaded._adjust_price(h) for h in raw.values()]
+
+    report("_adjust_price", n, rows, "rows/s", _measure(adjust, repeat))
+
+    report(
+        f"resample {interval}", n, rows, "rows/s",
+        _measure(lambda: _resample_frames(frames, interval), repeat),
+    )
+    return results
+
+
+def _format(results):
+    lines = [
+        f"{'benchmark':<16}{'n':>7}{'seconds':>10}{'throughput':>22}{'peak MB':>10}"
+    ]
+    for r in results:
+        if "modules" in r:
+            lines.append(
+                f"{r['name']}: {r['seconds']:.4f} seconds, loads "
+                f"{', '.join(r['modules']) or 'no heavy modules'}"
+            )
+            continue
+        lines.append(
+            f"{r['name']:<16}{r['n']:>7}{r['seconds']:>10.4f}"
+            f"{r['rate']:>12.0f} {r['unit']:<9}{r['peak_mb']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", help="recorded fixture file to replay")
+    parser.add_argument(
+        "--symbols", type=int, nargs="+", default=[1, 100, 3000],
+        help="numbers of symbols of history benchmarks",
+    )
+    parser.add_argument(
+        "--days", type=int, default=500,
+        help="trading days of each synthetic history",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--interval", default="w")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args(argv)
+
+    if args.fixture:
+        fixture = Fixture(args.fixture)
+    else:
+        fixture = synthetic_fixture(max(args.symbols), args.days)
+    results = run(fixture, args.symbols, args.repeat, args.interval)
+    for statement in ("import tse_index", "from tse_index import reader"):
+        seconds, loaded = import_time(statement, args.repeat)
+        results.append({
+            "name": statement,
+            "seconds": seconds,
+            "modules": loaded,
+        })
+    print(json.dumps(results, indent=2) if args.json else _format(results))
+    return results
+
+
+if __name__ == "__main__":
+    main()
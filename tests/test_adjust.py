@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+import pandas as pd
+import tse_index as tse
+
+
+def _reference_adjust_price(data, columns):
+    """Loop based adjustment kept to check the vectorized one"""
+    data = data.copy()
+    step = data.index.step
+    diff = list(data.index[data.shift(1).AdjClose != data.Yesterday])
+    if len(diff) > 0:
+        diff.pop(0)
+    ratio = 1
+    ratio_list = []
+    for i in diff[::-1]:
+        ratio *= data.loc[i, "Yesterday"] / data.shift(1).loc[i, "AdjClose"]
+        ratio_list.insert(0, ratio)
+    for i, k in enumerate(diff):
+        start = data.index.start if i == 0 else diff[i - 1]
+        end = diff[i] - step
+        data.loc[start:end, columns] = round(data.loc[start:end, columns] * ratio_list[i])
+    return data
+
+
+def _history(rng, n, events):
+    close = np.round(rng.uniform(1000, 5000, n))
+    yesterday = np.concatenate(([close[0]], close[:-1]))
+    for i in events:
+        yesterday[i] = np.round(close[i - 1] * rng.uniform(0.3, 0.9))
+    return pd.DataFrame({
+        "Date": np.arange(20100101, 20100101 + n),
+        "Open": close + 10, "High": close + 20, "Low": close - 20,
+        "Close": close, "Count": np.ones(n, dtype=np.int64),
+        "Volume": np.ones(n), "Value": close,
+        "AdjClose": close, "Yesterday": yesterday,
+    })
+
+
+class TestAdjustPrice(unittest.TestCase):
+    columns = ["Open", "High", "Low", "Close", "AdjClose", "Yesterday"]
+
+    def test_matches_reference(self) -> None:
+        rng = np.random.default_rng(0)
+        index = tse.reader()
+        for events in ([], [5], [3, 40, 41, 99], [1]):
+            data = _history(rng, 100, events)
+            pd.testing.assert_frame_equal(
+                index._adjust_price(data),
+                _reference_adjust_price(data, self.columns),
+            )
+
+    def test_batch(self) -> None:
+        rng = np.random.default_rng(1)
+        histories = {
+            "a": _history(rng, 50, [10, 30]),
+            "b": None,
+            "c": _history(rng, 20, []),
+            "d": _history(rng, 70, [69]),
+        }
+        adjusted = tse.reader()._adjust_prices(histories)
+        self.assertEqual(list(adjusted), ["a", "b", "c", "d"])
+        self.assertIsNone(adjusted["b"])
+        for k in ("a", "c", "d"):
+            pd.testing.assert_frame_equal(
+                adjusted[k], _reference_adjust_price(histories[k], self.columns)
+            )
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+import requests
+from tse_index.tse_scrapper import AsyncTSEClient, TSEClient
+from tse_index._utils import RemoteDataError
+
+
+def _response(status, text):
+    response = requests.models.Response()
+    response.status_code = status
+    response._content = text.encode("utf-8")
+    response._content_consumed = True
+    response.encoding = "utf-8"
+    return response
+
+
+class FakeSession(requests.Session):
+    """Session that answers from a list of responses or errors"""
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+ENVELOPE = (
+    '<?xml version="1.0" encoding="utf-8"?><soap:Envelope '
+    'xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+    '<LastPossibleDevenResponse xmlns="http://tsetmc.com/">'
+    "<LastPossibleDevenResult>{}</LastPossibleDevenResult>"
+    "</LastPossibleDevenResponse></soap:Body></soap:Envelope>"
+)
+
+
+class TestTSEClient(unittest.TestCase):
+    def test_retry_until_success(self) -> None:
+        session = FakeSession([
+            requests.exceptions.ConnectionError("reset"),
+            _response(500, "error"),
+            _response(200, ENVELOPE.format("20210901;20210901")),
+        ])
+        client = TSEClient(retry_count=3, pause=0, session=session)
+        self.assertEqual(client.LastPossibleDeven(), "20210901;20210901")
+        self.assertEqual(session.calls, 3)
+
+    def test_extract_large_result(self) -> None:
+        payload = ";".join(f"1,{20210000 + i},100" for i in range(50000))
+        session = FakeSession([
+            _response(200, ENVELOPE.replace("LastPossibleDeven", "Instrument")
+                      .format(payload))
+        ])
+        client = TSEClient(session=session)
+        self.assertEqual(client.Instrument(), payload)
+
+    def test_raise_when_retries_exhausted(self) -> None:
+        session = FakeSession([_response(500, "error")] * 3)
+        client = TSEClient(retry_count=2, pause=0, session=session)
+        with self.assertRaises(RemoteDataError):
+            client.LastPossibleDeven()
+        self.assertEqual(session.calls, 3)
+
+
+class TestAsyncTSEClient(unittest.TestCase):
+    def test_retry_and_limit(self) -> None:
+        try:
+            from aiohttp import web
+        except ImportError:
+            self.skipTest("aiohttp is not installed")
+
+        async def run():
+            calls = []
+
+            async def handle(request):
+                calls.append(request.headers["SOAPAction"])
+                if len(calls) == 1:
+                    return web.Response(status=500, text="error")
+                return web.Response(text=ENVELOPE.format("20210901;20210901"))
+
+            app = web.Application()
+            app.router.add_post("/", handle)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                async with AsyncTSEClient(pause=0, limit=2) as client:
+                    client.url = f"http://127.0.0.1:{port}/"
+                    deven = await client.LastPossibleDeven()
+            finally:
+                await runner.cleanup()
+            return deven, calls
+
+        deven, calls = asyncio.run(run())
+        self.assertEqual(deven, "20210901;20210901")
+        self.assertEqual(calls, ['"http://tsetmc.com/LastPossibleDeven"'] * 2)
@@ -0,0 +1,775 @@
+import asyncio
+import contextvars
+import datetime
+import gc
+import tempfile
+import threading
+import time
+import unittest
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import warnings
+import tse_index as tse
+from tse_index._calendar import _TradingCalendar
+from tse_index._chunks import _ChunkScheduler, _expected_rows
+from tse_index._utils import SymbolWarning
+from tse_index.tse import _OPTIONS
+
+
+INSTRUMENTS = (
+    "1,IRO1AAAA0001,AAAA1,Aaaa,AAAA,آلفا,آلفا سهامی,IRO1AAAA0000,20210901,1,آلفا,300,N1,NO,,Z1,Z111,A;"
+    "2,IRO1BBBB0001,BBBB1,Bbbb,BBBB,بتا,بتا سهامی,IRO1BBBB0000,20210901,1,بتا,300,N1,NO,,Z1,Z111,A;"
+    "3,IRXZXOCI0006,CCCC1,Cccc,CCCC,شاخص کل6,شاخص کل,IRXZXOCI0000,20210901,1,شاخص,I,N1,ID,,X1,X111,I"
+)
+
+
+def _closing_prices(insId, rows):
+    return ";".join(
+        f"{insId},{date},{close},{close},1,10,100,{close},{close},{close},{close}"
+        for date, close in rows
+    )
+
+
+class FakeClient:
+    """Offline stand-in for TSEClient serving fixed payloads"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self.instrumentCalls = []
+        self.instruments = INSTRUMENTS
+        self.lastPossibleDeven = "20210901;20210901"
+        self.shareCalls = []
+        self.shares = [
+            "7,1,20210830,2000,1000",
+            "8,2,20210830,1500,1000",
+            "9,1,20210831,1000,500",
+        ]
+        self.history = {
+            "1": [(20210829, 100), (20210830, 101), (20210831, 102)],
+            "2": [(20210829, 200), (20210830, 201)],
+            "3": [(20210829, 1000), (20210830, 1001), (20210831, 1002)],
+        }
+
+    def Instrument(self, InsLastDate="0"):
+        self.instrumentCalls.append(InsLastDate)
+        return self.instruments
+
+    def InstrumentAndShare(self, InsLastDate="0", ShareLastID=0):
+        self.shareCalls.append(ShareLastID)
+        shares = [s for s in self.shares if int(s.split(",")[0]) > ShareLastID]
+        return self.instruments + "@" + ";".join(shares)
+
+    def LastPossibleDeven(self):
+        return self.lastPossibleDeven
+
+    def DecompressAndGetInsturmentClosingPrice(self, insCodesList):
+        self.calls.append(insCodesList)
+        codes = [c.split(",") for c in insCodesList.split(";")]
+        if self.fail.intersection(c[0] for c in codes):
+            raise IOError("chunk failed")
+        return "@".join(
+            _closing_prices(i, [r for r in self.history[i] if r[0] > int(deven)])
+            for i, deven, _ in codes
+        )
+
+
+class FakeAsyncClient:
+    """Async twin of FakeClient"""
+
+    def __init__(self, fail=()):
+        self.sync = FakeClient(fail)
+        self.limit = 10
+        self.active = self.peak = 0
+
+    async def Instrument(self, InsLastDate="0"):
+        return self.sync.Instrument(InsLastDate)
+
+    async def LastPossibleDeven(self):
+        return self.sync.LastPossibleDeven()
+
+    async def DecompressAndGetInsturmentClosingPrice(self, insCodesList):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0)
+        self.active -= 1
+        return self.sync.DecompressAndGetInsturmentClosingPrice(insCodesList)
+
+
+def _reader(client, aclient=None, **kwargs):
+    index = tse.reader(**kwargs)
+    index.client = client
+    if aclient is not None:
+        index.aclient = aclient
+    return index
+
+
+class TestHistory(unittest.TestCase):
+    def test_concurrent_chunks(self) -> None:
+        client = FakeClient()
+        index = _reader(client, max_workers=3)
+        history = index.history(
+            ["آلفا", "بتا", "شاخص کل6"], start=20210801, chunksize=1
+        )
+        self.assertEqual(len(client.calls), 3)
+        self.assertEqual(list(history["آلفا"].Close), [100, 101, 102])
+        self.assertEqual(list(history["بتا"].Close), [200, 201])
+        self.assertEqual(list(history["شاخص کل6"].Close), [1000, 1001, 1002])
+
+    def test_failed_chunk_does_not_abort(self) -> None:
+        index = _reader(FakeClient(fail={"2"}), max_workers=2)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            history = index.history(["آلفا", "بتا"], start=20210801, chunksize=1)
+        self.assertIsNone(history["بتا"])
+        self.assertEqual(len(history["آلفا"]), 3)
+        self.assertTrue(
+            any(issubclass(w.category, SymbolWarning) for w in caught)
+        )
+
+    def test_ahistory(self) -> None:
+        aclient = FakeAsyncClient()
+        index = _reader(FakeClient(), aclient)
+        history = asyncio.run(
+            index.ahistory(
+                ["آلفا", "بتا", "شاخص کل6"], start=20210801, chunksize=1,
+                max_in_flight=2,
+            )
+        )
+        self.assertEqual(len(aclient.sync.calls), 3)
+        self.assertEqual(aclient.peak, 2)
+        # limit of the shared client is left to other calls
+        self.assertEqual(aclient.limit, 10)
+        self.assertEqual(list(history["آلفا"].Close), [100, 101, 102])
+        self.assertEqual(list(history["شاخص کل6"].Close), [1000, 1001, 1002])
+
+    def test_store_appends_new_rows(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            client = FakeClient()
+            client.lastPossibleDeven = "20210831;20210831"
+            index = _reader(client, store=path)
+            index.history("آلفا", start=20210801)
+
+            client = FakeClient()
+            client.history["1"] = [(20210901, 103)]
+            index = _reader(client, store=path, calendar_ttl=0)
+            history = index.history("آلفا", start=20210801)
+            self.assertEqual(client.calls, ["1,20210831,0"])
+            self.assertEqual(list(history.Close), [100, 101, 102, 103])
+            self.assertEqual(
+                list(index._store.load("آلفا").Date),
+                [20210829, 20210830, 20210831, 20210901],
+            )
+
+    def test_store_partial_record(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            client = FakeClient()
+            client.lastPossibleDeven = "20210831;20210831"
+            index = _reader(client, store=path)
+            index.history("آلفا", start=20210801)
+            # an append interrupted after 13 bytes
+            with open(index._store._file("آلفا"), "ab") as f:
+                f.write(b"\0" * 13)
+
+            client = FakeClient()
+            client.history["1"] = [(20210901, 103)]
+            index = _reader(client, store=path, calendar_ttl=0)
+            history = index.history("آلفا", start=20210801)
+            self.assertEqual(list(history.Close), [100, 101, 102, 103])
+            self.assertEqual(
+                list(index._store.load("آلفا").Close), [100, 101, 102, 103]
+            )
+
+    def test_store_symbol_of_two_ids(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            client = FakeClient()
+            # آلفا moved from id 1 to id 4
+            client.instruments = (
+                INSTRUMENTS.replace("1,IRO1AAAA0001", "4,IRO1AAAA0001", 1)
+                + ";" + INSTRUMENTS.split(";")[0]
+            )
+            client.history["4"] = client.history["1"]
+            client.history["1"] = [(20210825, 90), (20210826, 91)]
+            index = _reader(client, store=path)
+            history = index.history("آلفا", start=20210801, chunksize=1)
+            self.assertEqual(client.calls, ["4,0,0", "1,0,0"])
+            self.assertEqual(list(history.Close), [90, 91, 100, 101, 102])
+
+            index = _reader(client, store=path)
+            history = index.history("آلفا", start=20210801)
+            self.assertEqual(list(history.Close), [90, 91, 100, 101, 102])
+
+
+class TestChunks(unittest.TestCase):
+    def test_bisect_failed_chunk(self) -> None:
+        client = FakeClient(fail={"2"})
+        index = _reader(client)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            history = index.history(
+                ["آلفا", "بتا", "شاخص کل6"], start=20210801, chunksize=3
+            )
+        self.assertEqual(
+            client.calls,
+            ["1,0,0;2,0,0;3,0,1", "1,0,0", "2,0,0;3,0,1", "2,0,0", "3,0,1"],
+        )
+        self.assertIsNone(history["بتا"])
+        self.assertEqual(list(history["آلفا"].Close), [100, 101, 102])
+        self.assertEqual(list(history["شاخص کل6"].Close), [1000, 1001, 1002])
+        self.assertIn("بتا", str(caught[-1].message))
+        self.assertNotIn("آلفا", str(caught[-1].message))
+
+    def test_abisect_failed_chunk(self) -> None:
+        aclient = FakeAsyncClient(fail={"2"})
+        index = _reader(FakeClient(), aclient)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            history = asyncio.run(index.ahistory(
+                ["آلفا", "بتا", "شاخص کل6"], start=20210801, chunksize=3
+            ))
+        self.assertEqual(
+            sorted(aclient.sync.calls),
+            sorted(["1,0,0;2,0,0;3,0,1", "1,0,0", "2,0,0;3,0,1", "2,0,0", "3,0,1"]),
+        )
+        self.assertIsNone(history["بتا"])
+        self.assertEqual(list(history["شاخص کل6"].Close), [1000, 1001, 1002])
+
+    def test_bisect_truncated_chunk(self) -> None:
+        class TruncatingClient(FakeClient):
+            def DecompressAndGetInsturmentClosingPrice(self, insCodesList):
+                data = super().DecompressAndGetInsturmentClosingPrice(insCodesList)
+                return data.rpartition("@")[0] if "@" in data else data
+
+        client = TruncatingClient()
+        index = _reader(client, max_workers=2)
+        history = index.history(["آلفا", "بتا"], start=20210801)
+        self.assertEqual(len(client.calls), 3)
+        self.assertEqual(list(history["بتا"].Close), [200, 201])
+
+    def test_chunks_in_submission_order(self) -> None:
+        class FirstSlowClient(FakeClient):
+            def DecompressAndGetInsturmentClosingPrice(self, insCodesList):
+                if insCodesList.startswith("1,"):
+                    time.sleep(0.2)
+                return super().DecompressAndGetInsturmentClosingPrice(
+                    insCodesList
+                )
+
+        index = _reader(FirstSlowClient(), max_workers=3)
+        index.instruments()
+        index._history_options(
+            ["آلفا", "بتا", "شاخص کل6"], 20210801, None, None, None, False,
+            1, "d", 3,
+        )
+        index._update_last_possible_deven()
+        pairs = list(index._fetch_chunks(index._history_requests()))
+        self.assertEqual(
+            [chunk[0] for chunk, _ in pairs], [["آلفا"], ["بتا"], ["شاخص کل6"]]
+        )
+
+    def test_auto_chunks(self) -> None:
+        scheduler = _ChunkScheduler(target_rows=10)
+        pending = deque([("a", "1,0,0", 6), ("b", "2,0,0", 6), ("c", "3,0,0", 1)])
+        self.assertEqual(
+            scheduler.plan(pending),
+            [((["a"], "1,0,0"), 6), ((["b", "c"], "2,0,0;3,0,0"), 7)],
+        )
+        # Saturday to Wednesday after Friday 2021-08-27
+        self.assertEqual(_expected_rows(20210827, 20210901), 5)
+
+        scheduler = _ChunkScheduler(target_rows=10000, min_rows=1)
+        # slow chunk shrinks target, a fast small one does not grow it
+        scheduler.observe(8000, 8.0, 8000 * 50)
+        self.assertEqual(scheduler.target_rows, 5000)
+        scheduler.observe(10, 0.01, 500)
+        self.assertEqual(scheduler.target_rows, 5000)
+        scheduler.observe(5000, 1.0, 5000 * 50)
+        self.assertEqual(scheduler.target_rows, 10000)
+
+
+class SlowClient(FakeClient):
+    """FakeClient which holds requests long enough to overlap"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deven = []
+
+    def Instrument(self, InsLastDate="0"):
+        time.sleep(0.05)
+        return super().Instrument(InsLastDate)
+
+    def LastPossibleDeven(self):
+        self.deven.append(1)
+        time.sleep(0.05)
+        return super().LastPossibleDeven()
+
+    def DecompressAndGetInsturmentClosingPrice(self, insCodesList):
+        time.sleep(0.05)
+        return super().DecompressAndGetInsturmentClosingPrice(insCodesList)
+
+
+class TestConcurrency(unittest.TestCase):
+    def test_coalesce_fetches(self) -> None:
+        client = SlowClient()
+        client.lastPossibleDeven = "20210831;20210831"
+        index = _reader(client)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda _: index.history("آلفا", start=20210801), range(8)
+            ))
+        self.assertEqual(client.instrumentCalls, [0])
+        self.assertEqual(len(client.deven), 1)
+        self.assertEqual(client.calls, ["1,0,0"])
+        for history in results:
+            self.assertEqual(list(history.Close), [100, 101, 102])
+
+    def test_coalesce_async_fetches(self) -> None:
+        aclient = FakeAsyncClient()
+        aclient.sync.lastPossibleDeven = "20210831;20210831"
+        index = _reader(FakeClient(), aclient)
+
+        async def run():
+            return await asyncio.gather(*(
+                index.ahistory("آلفا", start=20210801, interval=interval)
+                for interval in ["d", "w", "d"]
+            ))
+
+        daily, weekly, again = asyncio.run(run())
+        self.assertEqual(aclient.sync.calls, ["1,0,0"])
+        self.assertEqual(len(daily), 3)
+        self.assertEqual(len(weekly), 1)
+        self.assertEqual(list(again.Close), [100, 101, 102])
+
+    def test_options_per_call(self) -> None:
+        client = SlowClient()
+        index = _reader(client)
+        index.history(["آلفا", "بتا"], start=20210801)
+
+        def read(args):
+            symbol, interval = args
+            return index.history(symbol, start=20210801, interval=interval)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            daily, weekly, other = executor.map(
+                read, [("آلفا", "d"), ("آلفا", "w"), ("بتا", "d")]
+            )
+        self.assertEqual(len(daily), 3)
+        self.assertEqual(len(weekly), 1)
+        self.assertEqual(list(other.Close), [200, 201])
+
+    def test_settings_per_call(self) -> None:
+        index = _reader(FakeClient())
+        client = index.aclient
+        index.history(
+            "آلفا", start=20210801, max_workers=8, retry_count=0, pause=1
+        )
+        self.assertIsNone(index.max_workers)
+        self.assertEqual((client.retry_count, client.pause), (3, 0.1))
+        self.assertEqual(client._retry_settings(), (0, 1))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            settings = executor.submit(client._retry_settings).result()
+        self.assertEqual(settings, (3, 0.1))
+
+    def test_options_of_released_reader(self) -> None:
+        def read():
+            index = _reader(FakeClient())
+            index.history("آلفا", start=20210801)
+            return weakref.ref(index), _OPTIONS.get()
+
+        released, readers = contextvars.Context().run(read)
+        gc.collect()
+        self.assertIsNone(released())
+        self.assertEqual(len(readers), 0)
+
+
+class TestInstruments(unittest.TestCase):
+    def test_merge_delta_keeps_order(self) -> None:
+        client = FakeClient()
+        index = _reader(client)
+        index.instruments()
+        client.instruments = (
+            "4,IRO1DDDD0001,DDDD1,Dddd,DDDD,بتا,بتا جدید,IRO1DDDD0000,20211001,1,بتا,300,N1,NO,,Z1,Z111,A;"
+            "5,IRO1EEEE0001,EEEE1,Eeee,EEEE,آ,آ سهامی,IRO1EEEE0000,20211001,1,آ,300,N1,NO,,Z1,Z111,A;"
+            "1,IRO1AAAA0001,AAAA1,Aaaa,AAAA,آلفا,آلفا جدید,IRO1AAAA0000,20210901,1,آلفا,300,N1,NO,,Z1,Z111,A"
+        )
+        index._instrumentsChecked = 0
+        instruments = index.instruments()
+        self.assertEqual(client.instrumentCalls, [0, 20210901])
+        self.assertEqual(list(instruments.id), [5, 1, 4, 2, 3])
+        self.assertEqual(instruments.name[1], "آلفا جدید")
+
+    def test_merge_delta_keeps_returned_list(self) -> None:
+        client = FakeClient()
+        index = _reader(client)
+        before = index.instruments()
+        names = list(before.name)
+        client.instruments = INSTRUMENTS.replace("آلفا سهامی", "آلفا جدید")
+        index._instrumentsChecked = 0
+        after = index.instruments()
+        self.assertEqual(list(before.name), names)
+        self.assertIn("آلفا جدید", list(after.name))
+
+    def test_catalog_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            _reader(FakeClient(), store=path).instruments()
+            client = FakeClient()
+            instruments = _reader(client, store=path).instruments()
+            self.assertEqual(client.instrumentCalls, [])
+            self.assertEqual(len(instruments), 3)
+
+    def test_indexed_lookups(self) -> None:
+        index = _reader(FakeClient())
+        index._fetch_groups = lambda: {"Z1": "گروه زد", "X1": "شاخص‌ها"}
+        self.assertEqual(list(index.instruments(group="گروه زد").id), [1, 2])
+        self.assertEqual(index.group_name("شاخص کل6"), "شاخص‌ها")
+        self.assertEqual(index._idIndex[3], 2)
+        self.assertTrue(index.instruments(group="ناموجود").empty)
+
+
+class TestSearch(unittest.TestCase):
+    def test_ranked_search(self) -> None:
+        index = _reader(FakeClient())
+        self.assertEqual(list(index.search("شاخص كل6").id), [3])
+        self.assertEqual(list(index.search("شاخص  ۶", market="index").id), [3])
+        self.assertTrue(index.search("شاخص", market="normal").empty)
+        self.assertEqual(list(index.search("bbbb").id), [2])
+        self.assertEqual(list(index.search("سهامی").id), [2, 1])
+        self.assertEqual(list(index.search("آ", top=1).id), [1])
+        # substrings match at any length of term
+        for term in ("لف", "لفا"):
+            self.assertEqual(list(index.search(term).id), [1])
+        self.assertEqual(sorted(index.search("ل").id), [1, 3])
+        self.assertEqual(len(index.search("")), 3)
+
+
+class TestPanel(unittest.TestCase):
+    def test_daily_panel(self) -> None:
+        index = _reader(FakeClient())
+        panel = index.history(["آلفا", "بتا", "شاخص کل6"], start=20210801, panel=True)
+        self.assertEqual(len(panel), 3)
+        self.assertEqual(list(panel["Close"]["آلفا"]), [100, 101, 102])
+        self.assertTrue(np.isnan(panel["Close"]["بتا"].iloc[-1]))
+        self.assertEqual(
+            list(panel.columns.get_level_values(1)[:3]), ["آلفا", "بتا", "شاخص کل6"]
+        )
+
+    def test_weekly_panel(self) -> None:
+        index = _reader(FakeClient())
+        panel = index.history(
+            ["آلفا", "بتا"], start=20210801, interval="w", panel=True
+        )
+        self.assertEqual(len(panel), 1)
+        self.assertEqual(panel["Close"]["آلفا"].iloc[0], 102)
+        self.assertEqual(panel["Open"]["بتا"].iloc[0], 200)
+        self.assertEqual(panel["Volume"]["آلفا"].iloc[0], 30)
+
+
+class TestCompact(unittest.TestCase):
+    def test_compact_history(self) -> None:
+        index = _reader(FakeClient(), compact=True)
+        history = index.history(["آلفا", "بتا"], start=20210801)
+        raw = index._history["آلفا"]
+        self.assertEqual(raw.Date.dtype, np.int32)
+        self.assertEqual(raw.Close.dtype, np.int32)
+        self.assertEqual(list(history["آلفا"].Close), [100, 101, 102])
+        self.assertEqual(index.instrumentList.market.dtype.name, "category")
+        self.assertEqual(list(index.search("شاخص", market="index").id), [3])
+        usage = index.memory_usage()
+        self.assertEqual(set(usage.index), {"آلفا", "بتا", "instrumentList"})
+
+        full = _reader(FakeClient())
+        full.history(["آلفا", "بتا"], start=20210801)
+        self.assertLess(usage["آلفا"], full.memory_usage()["آلفا"])
+
+
+class TestViewCache(unittest.TestCase):
+    def test_memoized_views(self) -> None:
+        client = FakeClient()
+        client.lastPossibleDeven = "20210831;20210831"
+        index = _reader(client, cache_size=4)
+        first = index.history("آلفا", start=20210801, interval="w")
+        misses = index._views.misses
+        second = index.history("آلفا", start=20210801, interval="w")
+        self.assertEqual(index._views.misses, misses)
+        pd.testing.assert_frame_equal(first, second)
+        second["Close"] = 0
+        self.assertEqual(
+            index.history("آلفا", start=20210801, interval="w").Close.iloc[0], 102
+        )
+
+        views = len(index._views)
+        index._merge_history("آلفا", index._history["آلفا"].tail(0))
+        self.assertEqual(len(index._views), views)
+        latest = index._history["آلفا"].tail(1).assign(Date=20210901)
+        index._merge_history("آلفا", latest)
+        self.assertEqual(len(index._views), 0)
+        index.history(["آلفا", "بتا"], start=20210801, interval="d")
+        self.assertLessEqual(len(index._views), 4)
+
+
+class TestBoundedHistory(unittest.TestCase):
+    def test_spill_and_reload(self) -> None:
+        client = FakeClient()
+        index = _reader(client, max_history_rows=3)
+        first = index.history(["آلفا", "بتا"], start=20210801)
+        self.assertEqual(list(index._history.resident()), ["بتا"])
+        self.assertEqual(set(index._history), {"آلفا", "بتا"})
+        calls = len(client.calls)
+        again = index.history("آلفا", start=20210801)
+        # fetched against the current last possible deven already
+        self.assertEqual(len(client.calls), calls)
+        self.assertEqual(list(again.Close), list(first["آلفا"].Close))
+        self.assertEqual(list(index._history.resident()), ["آلفا"])
+
+    def test_spill_to_store(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            index = _reader(FakeClient(), store=path, max_history_rows=2)
+            index.history(["آلفا", "بتا", "شاخص کل6"], start=20210801)
+            self.assertEqual(len(index._history.resident()), 1)
+            self.assertEqual(len(index._store.load("آلفا")), 3)
+
+
+class TestHistoryIter(unittest.TestCase):
+    def test_generate_per_chunk(self) -> None:
+        client = FakeClient()
+        client.lastPossibleDeven = "20210830;20210830"
+        index = _reader(client)
+        index.history("بتا", start=20210801)
+        client.calls.clear()
+        pairs = index.history_iter(
+            ["آلفا", "بتا", "شاخص کل6"], start=20210801, chunksize=1,
+            interval="w",
+        )
+        symbol, data = next(pairs)
+        self.assertEqual(symbol, "بتا")
+        self.assertEqual(client.calls, [])
+        self.assertEqual(data.Close.iloc[0], 201)
+        symbol, data = next(pairs)
+        self.assertEqual(symbol, "آلفا")
+        self.assertEqual(len(client.calls), 1)
+        self.assertEqual(data.Close.iloc[0], 102)
+        self.assertEqual(next(pairs)[1].Close.iloc[0], 1002)
+        self.assertEqual(list(pairs), [])
+
+    def test_batches_capped_by_max_symbols(self) -> None:
+        client = FakeClient()
+        index = _reader(client, max_workers=2)
+        index._scheduler.max_symbols = 1
+        pairs = index.history_iter(
+            ["آلفا", "بتا", "شاخص کل6"], start=20210801
+        )
+        self.assertEqual(next(pairs)[0], "آلفا")
+        self.assertEqual(len(client.calls), 2)
+        self.assertEqual([symbol for symbol, _ in pairs], ["بتا", "شاخص کل6"])
+        self.assertEqual(len(client.calls), 3)
+
+    def test_options_kept_between_steps(self) -> None:
+        index = _reader(FakeClient())
+        pairs = index.history_iter(
+            ["آلفا", "بتا"], start=20210801, chunksize=1, interval="w"
+        )
+        self.assertEqual(len(next(pairs)[1]), 1)
+        self.assertEqual(len(index.history("آلفا", start=20210801)), 3)
+        symbol, data = next(pairs)
+        self.assertEqual((symbol, len(data)), ("بتا", 1))
+        self.assertEqual(index.interval, "d")
+
+    def test_read_inside_loop(self) -> None:
+        index = _reader(FakeClient())
+        symbols = ["آلفا", "بتا", "شاخص کل6"]
+        read = []
+
+        def consume():
+            for symbol, _ in index.history_iter(
+                symbols, start=20210801, chunksize=1
+            ):
+                read.append(index.history(symbol, start=20210801, interval="w"))
+
+        thread = threading.Thread(target=consume, daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([len(r) for r in read], [1, 1, 1])
+
+
+class TestSync(unittest.TestCase):
+    def test_resume_from_checkpoint(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            checkpoint = f"{path}/checkpoint.json"
+            client = FakeClient(fail={"2"})
+            index = _reader(client, store=path)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                done = index.sync(chunksize=1, checkpoint=checkpoint)
+            self.assertEqual(done, {"آلفا": 20210831, "شاخص کل6": 20210831})
+
+            client = FakeClient()
+            progress = []
+            index = _reader(client, store=path)
+            done = index.sync(
+                chunksize=1, checkpoint=checkpoint,
+                progress=lambda n, total, symbols: progress.append((n, total)),
+            )
+            self.assertEqual(client.calls, ["2,0,0"])
+            self.assertEqual(progress, [(1, 1)])
+            self.assertEqual(done["بتا"], 20210830)
+            self.assertEqual(len(index._store.load("بتا")), 2)
+
+    def test_read_during_sync(self) -> None:
+        client = FakeClient()
+        index = _reader(client)
+        read = []
+
+        def progress(n, total, symbols):
+            # keys of symbols of later batches are not held yet
+            if not read:
+                executor = ThreadPoolExecutor(max_workers=1)
+                future = executor.submit(
+                    index.history, "شاخص کل6", start=20210801
+                )
+                executor.shutdown(wait=False)
+                read.append(future.result(timeout=5))
+
+        done = index.sync(chunksize=1, progress=progress)
+        self.assertEqual(len(read[0]), 3)
+        self.assertEqual(done["شاخص کل6"], 20210831)
+        self.assertEqual(client.calls.count("3,0,1"), 1)
+
+    def test_checkpoint_requires_store(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            index = _reader(FakeClient())
+            with self.assertRaises(ValueError):
+                index.sync(checkpoint=f"{path}/checkpoint.json")
+
+
+class TestShareLedger(unittest.TestCase):
+    def test_adjust_by_shares(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            client = FakeClient()
+            index = _reader(client, store=path)
+            history = index.history(
+                ["آلفا", "شاخص کل6"], start=20210801, adjust_price="shares"
+            )
+            self.assertEqual(client.shareCalls, [0])
+            # 1000 -> 2000 on 0830 and 500 -> 1000 on 0831
+            self.assertEqual(list(history["آلفا"].Close), [25, 50, 102])
+            self.assertEqual(list(history["شاخص کل6"].Close), [1000, 1001, 1002])
+            factors = index.share_factors("آلفا")
+            self.assertEqual(list(factors), [0.25, 0.5])
+
+            client = FakeClient()
+            client.shares.append("10,1,20210901,2000,1000")
+            index = _reader(client, store=path)
+            self.assertEqual(index.update_shares(), 1)
+            self.assertEqual(client.shareCalls, [9])
+            self.assertEqual(list(index.share_factors("آلفا")), [0.125, 0.25, 0.5])
+
+
+class TestProcesses(unittest.TestCase):
+    def test_worker_processes(self) -> None:
+        symbols = ["آلفا", "بتا", "شاخص کل6"]
+        for adjust_price in (True, "shares"):
+            for interval in ("d", "w"):
+                expected = _reader(FakeClient()).history(
+                    symbols, start=20210801, interval=interval,
+                    adjust_price=adjust_price,
+                )
+                index = _reader(FakeClient(), processes=2)
+                try:
+                    history = index.history(
+                        symbols, start=20210801, interval=interval,
+                        adjust_price=adjust_price,
+                    )
+                    self.assertEqual(
+                        index._pool._mp_context.get_start_method(), "spawn"
+                    )
+                finally:
+                    index.close()
+                for symbol in symbols:
+                    pd.testing.assert_frame_equal(
+                        history[symbol], expected[symbol]
+                    )
+
+
+class TestCalendar(unittest.TestCase):
+    def test_outdated(self) -> None:
+        calendar = _TradingCalendar()
+        self.assertTrue(calendar.outdated())
+        # fetched on Wednesday
+        checked = datetime.datetime(2021, 9, 1, 12).timestamp()
+        calendar.set_last_possible_deven("20210901;20210901", checked)
+        self.assertFalse(calendar.outdated(20210901, checked + 60))
+        # no trading on Thursday and Friday
+        self.assertFalse(calendar.outdated(20210903, checked + 2 * 86400))
+        self.assertTrue(calendar.outdated(20210904, checked + 3 * 86400))
+        # Wednesday was a holiday when checked on Thursday
+        checked = datetime.datetime(2021, 9, 2, 12).timestamp()
+        calendar.set_last_possible_deven("20210831;20210831", checked)
+        self.assertFalse(calendar.outdated(20210903, checked + 86400))
+
+    def test_invalid_deven(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            calendar = _TradingCalendar(path)
+            calendar.set_last_possible_deven("20210901;20210901")
+            for deven in ("", "20210901", "a;b"):
+                with self.assertRaises(IOError):
+                    calendar.set_last_possible_deven(deven)
+            self.assertEqual(
+                _TradingCalendar(path).lastPossibleDeven, "20210901;20210901"
+            )
+
+            with open(calendar.file, "w", encoding="utf-8") as f:
+                f.write('{"dates": [], "lastPossibleDeven": "", "checked": 0}')
+            calendar = _TradingCalendar(path)
+            self.assertIsNone(calendar.lastPossibleDeven)
+            self.assertTrue(calendar.outdated())
+
+    def test_trading_days(self) -> None:
+        calendar = _TradingCalendar()
+        self.assertEqual(calendar.trading_days(20210828, 20210901), 4)
+        # Monday was a holiday
+        self.assertEqual(calendar.add_dates([20210828, 20210829, 20210831]), 3)
+        self.assertEqual(calendar.add_dates([20210829]), 0)
+        self.assertEqual(calendar.trading_days(20210828, 20210901), 3)
+
+    def test_offline_history(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            client = FakeClient()
+            client.lastPossibleDeven = "20210831;20210831"
+            _reader(client, store=path).history(["آلفا", "شاخص کل6"], start=20210801)
+
+            client = FakeClient()
+            devens = []
+            client.LastPossibleDeven = lambda: devens.append(1) or "20210902;20210902"
+            index = _reader(client, store=path)
+            self.assertEqual(
+                list(index._calendar.dates), [20210829, 20210830, 20210831]
+            )
+            history = index.history("آلفا", start=20210801)
+            self.assertEqual(list(history.Close), [100, 101, 102])
+            self.assertEqual((devens, client.calls), ([], []))
+
+            index = _reader(client, store=path, calendar_ttl=0)
+            index.history("آلفا", start=20210801)
+            self.assertEqual(len(devens), 1)
+            self.assertEqual(index.lastPossibleDeven, "20210902;20210902")
+            self.assertEqual(len(client.calls), 1)
+
+    def test_halted_symbol(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            # بتا has no record since 20210830
+            client = FakeClient()
+            for _ in range(2):
+                _reader(client, store=path, calendar_ttl=0).history(
+                    "بتا", start=20210801
+                )
+            self.assertEqual(client.calls, ["2,0,0"])
+
+            client.lastPossibleDeven = "20210902;20210902"
+            _reader(client, store=path, calendar_ttl=0).history(
+                "بتا", start=20210801
+            )
+            self.assertEqual(client.calls, ["2,0,0", "2,20210830,0"])
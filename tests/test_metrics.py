@@ -0,0 +1,81 @@
+import unittest
+import requests
+import tse_index as tse
+from tse_index._metrics import Metrics
+from tse_index.tse_scrapper import TSEClient
+from tse_index._transport import ReplaySession
+from tests.test_client import ENVELOPE, FakeSession, _response
+from tests.test_transport import _fixture
+
+
+class TestMetrics(unittest.TestCase):
+    def test_history_record(self) -> None:
+        records = []
+        index = tse.reader(session=ReplaySession(_fixture()), max_workers=2)
+        index.metrics.add_hook(records.append)
+        index.history(["آلفا", "شاخص کل6"], start=20210801, chunksize=1)
+        self.assertEqual([r["call"] for r in records], ["history"])
+        record = records[0]
+        self.assertTrue(
+            {"request", "parse", "merge", "adjust", "instruments"}
+            <= set(record["stages"])
+        )
+        counters = record["counters"]
+        # Instrument, LastPossibleDeven and two chunks
+        self.assertEqual(counters["requests"], 4)
+        self.assertEqual(counters["rows"], 5)
+        self.assertGreater(counters["request_bytes"], 0)
+        self.assertGreater(counters["response_bytes"], 0)
+        self.assertNotIn("retries", counters)
+
+        index.history("آلفا", start=20210801)
+        self.assertEqual(len(records), 2)
+        # last possible deven is cached, history is current
+        self.assertNotIn("requests", records[1]["counters"])
+        self.assertNotIn("rows", records[1]["counters"])
+
+    def test_history_iter_record(self) -> None:
+        records = []
+        index = tse.reader(session=ReplaySession(_fixture()))
+        index.metrics.add_hook(records.append)
+        pairs = index.history_iter(
+            ["آلفا", "شاخص کل6"], start=20210801, chunksize=1
+        )
+        next(pairs)
+        self.assertEqual(records, [])
+        index.history("آلفا", start=20210801)
+        self.assertEqual(len(records), 1)
+        self.assertNotIn("requests", records[0]["counters"])
+        list(pairs)
+        self.assertEqual([r["call"] for r in records], ["history", "history"])
+        counters = records[1]["counters"]
+        self.assertEqual((counters["requests"], counters["rows"]), (4, 5))
+        self.assertIn("merge", records[1]["stages"])
+
+    def test_retries(self) -> None:
+        session = FakeSession([
+            requests.exceptions.ConnectionError("reset"),
+            _response(200, ENVELOPE.format("20210901;20210901")),
+        ])
+        metrics = Metrics()
+        client = TSEClient(pause=0, session=session, metrics=metrics)
+        client.LastPossibleDeven()
+        totals = {
+            (name, tuple(labels.items())): value
+            for name, labels, value in metrics.snapshot()
+        }
+        self.assertEqual(totals[("requests", ())], 2)
+        self.assertEqual(totals[("retries", ())], 1)
+        key = ("stage_calls", (("action", "LastPossibleDeven"), ("stage", "request")))
+        self.assertEqual(totals[key], 1)
+
+    def test_prometheus(self) -> None:
+        metrics = Metrics()
+        metrics.count("requests", 3)
+        metrics.count("response_bytes", 1234567, action='a"b')
+        text = metrics.to_prometheus()
+        self.assertIn("# TYPE tse_index_requests_total counter\n", text)
+        self.assertIn("tse_index_requests_total 3\n", text)
+        self.assertIn(
+            'tse_index_response_bytes_total{action="a\\"b"} 1234567\n', text
+        )
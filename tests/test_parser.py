@@ -0,0 +1,25 @@
+import unittest
+from tse_index import settings
+from tse_index._parser import _parse_closing_prices, _to_frame
+
+
+class TestParseClosingPrices(unittest.TestCase):
+    def test_split_by_id(self) -> None:
+        data = (
+            "11,20210830,10,10,1,5,50,9,11,9,10;"
+            "11,20210831,12,12,0,0,0,12,12,10,12;"
+            "11,20210901,13,13,2,6,60,12,14,12,13"
+            "@22,20210901,20,20,3,7,70,19,21,19,20"
+            "@"
+        )
+        parsed = _parse_closing_prices(data, [11, 22, 33])
+        self.assertEqual(list(parsed[11]["Date"]), [20210830, 20210901])
+        self.assertEqual(list(parsed[22]["Close"]), [20.0])
+        self.assertEqual(len(parsed[33]["Date"]), 0)
+        frame = _to_frame(parsed[11])
+        self.assertEqual(list(frame.columns), settings._TSE_FIELD_ORDER)
+        self.assertEqual(list(frame.Open), [10.0, 13.0])
+
+    def test_empty_response(self) -> None:
+        parsed = _parse_closing_prices("", [11])
+        self.assertTrue(_to_frame(parsed[11]).empty)
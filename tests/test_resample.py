@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+import pandas as pd
+from tse_index._resample import _period_labels, _resample_frames
+
+
+def _daily(rng, start, n):
+    index = pd.bdate_range(start, periods=n, name="Date")
+    close = rng.uniform(100, 200, n)
+    return pd.DataFrame({
+        "Open": close + 1, "High": close + 5, "Low": close - 5,
+        "Close": close, "Count": rng.integers(1, 10, n),
+        "Volume": rng.uniform(1, 100, n), "Value": rng.uniform(1, 100, n),
+    }, index=index)
+
+
+class TestResample(unittest.TestCase):
+    def test_matches_pandas(self) -> None:
+        rng = np.random.default_rng(0)
+        frames = {"a": _daily(rng, "2020-01-01", 300), "b": None,
+                  "c": _daily(rng, "2020-06-10", 40)}
+        how = {"Open": "first", "High": "max", "Low": "min", "Close": "last",
+               "Count": "sum", "Volume": "sum", "Value": "sum"}
+        for interval, rule in (("w", "W-SAT"), ("m", "MS")):
+            result = _resample_frames(frames, interval)
+            self.assertIsNone(result["b"])
+            for k in ("a", "c"):
+                expected = frames[k].resample(rule).agg(how)
+                if interval == "m":
+                    expected.index = expected.index + pd.offsets.MonthEnd(0)
+                np.testing.assert_allclose(
+                    result[k].to_numpy(dtype=float),
+                    expected.to_numpy(dtype=float),
+                )
+                self.assertEqual(list(result[k].index), list(expected.index))
+
+    def test_jalali_labels(self) -> None:
+        days = np.array(["2021-04-05", "2021-08-29", "2021-03-20"],
+                        dtype="datetime64[D]")
+        self.assertEqual(
+            list(_period_labels(days, "jm").astype(str)),
+            ["2021-04-20", "2021-09-22", "2021-03-20"],
+        )
+        self.assertEqual(
+            list(_period_labels(days, "jy").astype(str)),
+            ["2022-03-20", "2022-03-20", "2021-03-20"],
+        )
+        self.assertEqual(
+            list(_period_labels(days, "jw").astype(str)),
+            ["2021-04-09", "2021-09-03", "2021-03-26"],
+        )
@@ -0,0 +1,114 @@
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+import tse_index as tse
+from tse_index._utils import RemoteDataError
+from tse_index.tse_scrapper import TSEClient
+from tse_index._transport import Fixture, RecordSession, ReplaySession
+from tests.test_client import ENVELOPE, FakeSession, _response
+from tests.test_history import INSTRUMENTS, _closing_prices
+
+
+def _fixture():
+    fixture = Fixture()
+    fixture.add_instruments(INSTRUMENTS)
+    fixture.add_shares("7,1,20210830,2000,1000;8,2,20210830,1500,1000")
+    fixture.lastPossibleDeven = "20210831;20210831"
+    fixture.add_closing_prices(
+        _closing_prices(1, [(20210829, 100), (20210830, 101), (20210831, 102)])
+        + "@"
+        + _closing_prices(3, [(20210830, 1000), (20210831, 1001)])
+    )
+    return fixture
+
+
+def _load_bench():
+    path = Path(__file__).resolve().parents[1] / "benchmarks" / "bench.py"
+    spec = importlib.util.spec_from_file_location("bench", path)
+    bench = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bench)
+    return bench
+
+
+class TestReplaySession(unittest.TestCase):
+    def test_answer_any_chunk(self) -> None:
+        client = TSEClient(session=ReplaySession(_fixture()))
+        self.assertEqual(client.LastPossibleDeven(), "20210831;20210831")
+        self.assertEqual(client.Instrument("20210901"), "")
+        self.assertEqual(len(client.Instrument().split(";")), 3)
+        self.assertEqual(
+            client.InstrumentAndShare("20210901", 7), "@8,2,20210830,1500,1000"
+        )
+        data = client.DecompressAndGetInsturmentClosingPrice(
+            "1,20210829,0;2,0,0;3,0,1"
+        )
+        records = data.split("@")
+        self.assertEqual(len(records), 3)
+        self.assertEqual(
+            [r.split(",")[1] for r in records[0].split(";")],
+            ["20210830", "20210831"],
+        )
+        self.assertEqual(records[1], "")
+
+    def test_not_recorded(self) -> None:
+        session = ReplaySession(Fixture())
+        client = TSEClient(retry_count=0, pause=0, session=session)
+        with self.assertRaises(RemoteDataError):
+            client._request("GET", "http://example.com/")
+
+    def test_record_and_replay(self) -> None:
+        payload = _closing_prices(1, [(20210829, 100), (20210830, 101)])
+        session = FakeSession([
+            _response(200, ENVELOPE.format("20210830;20210830")),
+            _response(200, ENVELOPE.replace(
+                "LastPossibleDeven", "DecompressAndGetInsturmentClosingPrice"
+            ).format(payload)),
+        ])
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "fixture.json.gz"
+            with RecordSession(path, session) as recorder:
+                client = TSEClient(session=recorder)
+                client.LastPossibleDeven()
+                self.assertEqual(
+                    client.DecompressAndGetInsturmentClosingPrice("1,0,0"),
+                    payload,
+                )
+                # written on close only
+                self.assertFalse(path.exists())
+            replay = TSEClient(session=ReplaySession(path))
+            self.assertEqual(replay.LastPossibleDeven(), "20210830;20210830")
+            self.assertEqual(
+                replay.DecompressAndGetInsturmentClosingPrice("1,0,0"), payload
+            )
+
+    def test_reader_offline(self) -> None:
+        index = tse.reader(session=ReplaySession(_fixture()))
+        history = index.history(["آلفا", "شاخص کل6"], start=20210801)
+        self.assertEqual(list(history["آلفا"].Close), [100, 101, 102])
+        self.assertEqual(list(history["شاخص کل6"].Close), [1000, 1001])
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run(self) -> None:
+        bench = _load_bench()
+        fixture = bench.synthetic_fixture(symbols=5, days=30)
+        results = bench.run(fixture, sizes=(1, 5), repeat=1)
+        self.assertEqual(
+            [r["name"] for r in results],
+            ["instruments", "search", "history", "history", "_adjust_price",
+             "resample w"],
+        )
+        self.assertTrue(all(r["seconds"] > 0 for r in results))
+        self.assertTrue(all(r["peak_mb"] > 0 for r in results))
+
+    def test_import_time(self) -> None:
+        bench = _load_bench()
+        for statement in ("import tse_index", "import tse_index.cli"):
+            seconds, loaded = bench.import_time(statement, repeat=1)
+            self.assertGreater(seconds, 0)
+            self.assertEqual(loaded, [])
+        _, loaded = bench.import_time("from tse_index import reader", repeat=1)
+        self.assertIn("pandas", loaded)
+        self.assertNotIn("aiohttp", loaded)
+        self.assertNotIn("bs4", loaded)
@@ -1 +1,15 @@
-from .tse import reader
+__all__ = ["reader"]
+
+
+def __getattr__(name):
+    # reader pulls in pandas and requests, import it on first access so
+    # that importing tse_index and its submodules stays fast
+    if name == "reader":
+        from .tse import reader
+
+        return reader
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
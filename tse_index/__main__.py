@@ -0,0 +1,5 @@
+import sys
+
+from tse_index.cli import main
+
+sys.exit(main())
@@ -0,0 +1,207 @@
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class _ViewCache:
+    """
+    LRU cache of derived history views
+
+    Keys are tuples starting with symbol, so all of views of a symbol can
+    be dropped when its history changes. Methods are thread-safe.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of cached views, 0 disables the cache.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._views)
+
+    def get(self, key):
+        with self._lock:
+            view = self._views.get(key)
+            if view is None:
+                self.misses += 1
+                return None
+            self._views.move_to_end(key)
+            self.hits += 1
+            return view
+
+    def put(self, key, view):
+        if self.maxsize <= 0 or view is None:
+            return
+        with self._lock:
+            self._views[key] = view
+            self._views.move_to_end(key)
+            while len(self._views) > self.maxsize:
+                self._views.popitem(last=False)
+
+    def invalidate(self, symbol):
+        """Drop cached views of symbol"""
+        with self._lock:
+            for key in [k for k in self._views if k[0] == symbol]:
+                del self._views[key]
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+class _HistoryCache(MutableMapping):
+    """
+    Bounded mapping of symbol to history DataFrame
+
+    Least recently used histories are spilled to a _HistoryStore when
+    the number of rows or bytes held in memory exceeds the budget, and are
+    loaded back transparently on access. Methods are thread-safe.
+
+    Parameters
+    ----------
+    max_rows : int, default None
+        Maximum number of history rows kept in memory.
+    max_bytes : int, default None
+        Maximum bytes of histories kept in memory.
+    store : _HistoryStore, default None
+        Store to spill to. New rows are appended to it on eviction. When
+        None, a temporary directory is used.
+    convert : callable, default None
+        Applied to histories loaded back from the store.
+    """
+
+    def __init__(self, max_rows=None, max_bytes=None, store=None, convert=None):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._store = store
+        self._ownStore = False
+        self._convert = convert
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._dirty = set()
+        self._spilled = set()
+        self._rows = 0
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def __getitem__(self, symbol):
+        with self._lock:
+            return self._get(symbol)
+
+    def _get(self, symbol):
+        if symbol in self._data:
+            self._data.move_to_end(symbol)
+            return self._data[symbol]
+        if symbol not in self._spilled:
+            raise KeyError(symbol)
+        data = self._store.load(symbol)
+        if self._convert is not None and data is not None:
+            data = self._convert(data)
+        self._spilled.discard(symbol)
+        self._insert(symbol, data)
+        self._evict(keep=symbol)
+        return data
+
+    def __setitem__(self, symbol, data):
+        with self._lock:
+            self._spilled.discard(symbol)
+            self._remove(symbol)
+            self._insert(symbol, data)
+            self._dirty.add(symbol)
+            self._evict(keep=symbol)
+
+    def __delitem__(self, symbol):
+        with self._lock:
+            if symbol not in self:
+                raise KeyError(symbol)
+            self._remove(symbol)
+            self._spilled.discard(symbol)
+
+    def __contains__(self, symbol):
+        with self._lock:
+            return symbol in self._data or symbol in self._spilled
+
+    def __iter__(self):
+        with self._lock:
+            return iter(
+                list(self._data) + [s for s in self._spilled if s not in self._data]
+            )
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data) + len(self._spilled)
+
+    def get(self, symbol, default=None):
+        with self._lock:
+            try:
+                return self._get(symbol)
+            except KeyError:
+                return default
+
+    def resident(self):
+        """Return histories held in memory"""
+        with self._lock:
+            return dict(self._data)
+
+    @staticmethod
+    def _size(data):
+        if data is None:
+            return 0, 0
+        return len(data), int(data.memory_usage(index=True, deep=True).sum())
+
+    def _insert(self, symbol, data):
+        self._data[symbol] = data
+        self._sizes[symbol] = self._size(data)
+        self._rows += self._sizes[symbol][0]
+        self._bytes += self._sizes[symbol][1]
+
+    def _remove(self, symbol):
+        if symbol in self._data:
+            rows, size = self._sizes.pop(symbol)
+            self._rows -= rows
+            self._bytes -= size
+            del self._data[symbol]
+        self._dirty.discard(symbol)
+
+    def _over_budget(self):
+        return (self.max_rows is not None and self._rows > self.max_rows) or (
+            self.max_bytes is not None and self._bytes > self.max_bytes
+        )
+
+    def _spill_store(self):
+        if self._store is None:
+            from tse_index._store import _HistoryStore
+
+            path = tempfile.mkdtemp(prefix="tse_index_")
+            weakref.finalize(self, shutil.rmtree, path, True)
+            self._store = _HistoryStore(path)
+            self._ownStore = True
+        return self._store
+
+    def _evict(self, keep=None):
+        while self._over_budget():
+            symbol = next((s for s in self._data if s != keep), None)
+            if symbol is None:
+                break
+            data = self._data[symbol]
+            if data is None:
+                self._remove(symbol)
+                continue
+            store = self._spill_store()
+            if symbol in self._dirty or symbol not in store:
+                if self._ownStore:
+                    self._store.write(symbol, data)
+                else:
+                    self._store.append(symbol, data)
+            self._remove(symbol)
+            self._spilled.add(symbol)
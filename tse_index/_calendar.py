@@ -0,0 +1,171 @@
+import datetime
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from tse_index._chunks import _expected_rows
+from tse_index._utils import RemoteDataError
+
+
+def _valid_deven(deven):
+    """Whether deven is 'normal;index' last possible devens"""
+    if not isinstance(deven, str):
+        return False
+    parts = deven.split(";")
+    return len(parts) == 2 and all(p.strip().isdigit() for p in parts)
+
+
+class _TradingCalendar:
+    """
+    Trading days of tsetmc and the cached last possible deven
+
+    Trading days are learned from dates of fetched index histories, which
+    have a record on every trading day, and days after the last known one
+    are assumed to follow the Saturday to Wednesday week. The last possible
+    deven is fetched again only when it is older than ttl seconds and a
+    trading day may have passed since, so on weekends, on holidays already
+    checked and on repeated calls within ttl no request is sent. Symbols
+    fetched against the current last possible deven are kept too, so ones
+    without a record since, such as halted symbols, are not requested
+    again until it changes. Methods are thread-safe.
+
+    Parameters
+    ----------
+    path : str or Path, default None
+        Directory to persist the calendar in, None keeps it in memory.
+    ttl : float, default 3600
+        Seconds a fetched last possible deven is trusted without checking
+        the calendar.
+    """
+
+    _FILE = "calendar.json"
+
+    def __init__(self, path=None, ttl=3600):
+        self.file = None if path is None else Path(path) / self._FILE
+        self.ttl = ttl
+        self.dates = np.empty(0, np.int64)
+        self.lastPossibleDeven = None
+        self.checked = 0.0
+        # {symbol: last possible deven it was last fetched against}
+        self.updated = {}
+        self._lock = threading.Lock()
+        if self.file is not None and self.file.exists():
+            with open(self.file, encoding="utf-8") as f:
+                state = json.load(f)
+            self.dates = np.asarray(state["dates"], np.int64)
+            # an invalid deven is left outdated to be fetched again
+            if _valid_deven(state["lastPossibleDeven"]):
+                self.lastPossibleDeven = state["lastPossibleDeven"]
+                self.checked = state["checked"]
+                self.updated = state.get("updated", {})
+
+    def set_last_possible_deven(self, deven, checked=None):
+        """
+        Keep deven fetched at checked, default now, as of time.time()
+
+        Raises RemoteDataError when deven is not two dates separated by
+        ';', so an empty or broken response is never kept.
+        """
+        if not _valid_deven(deven):
+            raise RemoteDataError(
+                f"Last possible date request returned no data: {deven!r}"
+            )
+        with self._lock:
+            if deven != self.lastPossibleDeven:
+                self.updated = {}
+            self.lastPossibleDeven = deven
+            self.checked = time.time() if checked is None else checked
+            self._save()
+
+    def add_dates(self, dates):
+        """Add Dates of an index history, returns number of new days"""
+        dates = np.unique(np.asarray(dates, np.int64))
+        with self._lock:
+            count = len(np.setdiff1d(dates, self.dates, assume_unique=True))
+            if count:
+                self.dates = np.union1d(self.dates, dates)
+                self._save()
+            return count
+
+    def mark_updated(self, symbols):
+        """Keep symbols as fetched against the current last possible deven"""
+        with self._lock:
+            if self.lastPossibleDeven is None:
+                return
+            new = [
+                s for s in symbols
+                if self.updated.get(s) != self.lastPossibleDeven
+            ]
+            if new:
+                self.updated.update(dict.fromkeys(new, self.lastPossibleDeven))
+                self._save()
+
+    def is_updated(self, symbol):
+        """Whether symbol was fetched against the current last possible deven"""
+        deven = self.lastPossibleDeven
+        return deven is not None and self.updated.get(symbol) == deven
+
+    def last_deven(self):
+        """Return the latest of last possible devens of markets"""
+        return max(map(int, self.lastPossibleDeven.split(";")))
+
+    def trading_days(self, after, upto):
+        """
+        Return number of trading days after deven `after` up to `upto`
+
+        Days within known dates are counted exactly, holidays included,
+        and later days by the trading week.
+        """
+        dates = self.dates
+        if not len(dates) or after < dates[0]:
+            return _expected_rows(after, upto)
+        last = int(dates[-1])
+        known = np.searchsorted(dates, min(upto, last), "right") - (
+            np.searchsorted(dates, after, "right")
+        )
+        return int(max(known, 0)) + _expected_rows(max(after, last), upto)
+
+    def outdated(self, today=None, now=None):
+        """Whether last possible deven should be fetched again"""
+        with self._lock:
+            if self.lastPossibleDeven is None:
+                return True
+            now = time.time() if now is None else now
+            if now - self.checked < self.ttl:
+                return False
+            if today is None:
+                today = int(datetime.date.today().strftime("%Y%m%d"))
+            last = self.last_deven()
+            # records of days before the day of last check were published
+            # by then, so days up to it without records were holidays
+            settled = int(
+                (
+                    datetime.date.fromtimestamp(self.checked)
+                    - datetime.timedelta(days=1)
+                ).strftime("%Y%m%d")
+            )
+            return (
+                today > last
+                and self.trading_days(max(last, settled), today) > 0
+            )
+
+    def _save(self):
+        if self.file is None:
+            return
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dates": self.dates.tolist(),
+                    "lastPossibleDeven": self.lastPossibleDeven,
+                    "checked": self.checked,
+                    "updated": self.updated,
+                },
+                f,
+            )
+        os.replace(tmp, self.file)
@@ -0,0 +1,191 @@
+import threading
+
+from tse_index import settings
+from tse_index._utils import RemoteDataError
+
+# trading days of tsetmc are Saturday to Wednesday
+_WEEKMASK = "Sat Sun Mon Tue Wed"
+
+
+def _expected_rows(deven, lastPossibleDeven):
+    """Return number of trading days after deven up to lastPossibleDeven"""
+    import numpy as np
+
+    start = max(int(deven), settings.DEFAULT_START_DATE)
+    if start >= lastPossibleDeven:
+        return 0
+    start, end = (
+        np.datetime64(f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}")
+        for d in (start, lastPossibleDeven)
+    )
+    return int(np.busday_count(start + 1, end + 1, weekmask=_WEEKMASK))
+
+
+def _check_response(codes, response):
+    """Raise RemoteDataError if response has not a part per instrument"""
+    parts = response.count("@") + 1
+    if parts != len(codes):
+        raise RemoteDataError(
+            f"Truncated response: {parts} parts for {len(codes)} instruments"
+        )
+
+
+class _ChunkScheduler:
+    """
+    Size chunks of closing price requests
+
+    With an integer chunksize every chunk has chunksize instruments. With
+    'auto' a chunk takes instruments while their expected rows, trading
+    days since their last stored record, fit in target_rows. Target is
+    tuned by observed chunks toward target_seconds of latency and
+    max_bytes of response, so one-day deltas are batched in large chunks
+    and cold backfills in small ones.
+
+    Failed or truncated chunks are bisected until a single instrument
+    is left, so records of good instruments still land.
+    """
+
+    def __init__(
+        self, target_rows=100000, target_seconds=2.0,
+        max_bytes=16 * 2 ** 20, max_symbols=100, min_rows=1000,
+        max_rows=2000000,
+    ):
+        self.target_rows = target_rows
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.max_symbols = max_symbols
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.bytes_per_row = None
+        self._lock = threading.Lock()
+
+    def take(self, pending, chunksize="auto"):
+        """
+        Pop items of next chunk from the left of pending deque
+
+        Items are (symbol, code, expected rows) and a chunk is returned as
+        (symbols, ";" joined codes) with expected rows of chunk.
+        """
+        items = [pending.popleft()]
+        if chunksize == "auto":
+            rows = items[0][2]
+            while (
+                pending and len(items) < self.max_symbols
+                and rows + pending[0][2] <= self.target_rows
+            ):
+                rows += pending[0][2]
+                items.append(pending.popleft())
+        else:
+            while pending and len(items) < chunksize:
+                items.append(pending.popleft())
+        return (
+            [i[0] for i in items], ";".join(i[1] for i in items)
+        ), sum(i[2] for i in items)
+
+    def plan(self, pending, chunksize="auto"):
+        """Split pending deque into list of (chunk, expected rows)"""
+        chunks = []
+        while pending:
+            chunks.append(self.take(pending, chunksize))
+        return chunks
+
+    def observe(self, rows, seconds, size):
+        """Tune target_rows by rows, latency and bytes of a chunk"""
+        if rows <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            perRow = size / rows
+            self.bytes_per_row = (
+                perRow if self.bytes_per_row is None
+                else 0.8 * self.bytes_per_row + 0.2 * perRow
+            )
+            estimate = rows * self.target_seconds / seconds
+            # a small chunk only tells that target is too large when slow
+            if rows >= self.target_rows / 2 or seconds > self.target_seconds:
+                target = min(
+                    max(estimate, self.target_rows / 2), self.target_rows * 2
+                )
+                target = min(target, self.max_bytes / self.bytes_per_row)
+                self.target_rows = int(
+                    min(max(target, self.min_rows), self.max_rows)
+                )
+
+    def fetch(self, chunk, request):
+        """
+        Return (chunk, response) pairs of a chunk and of its bisections
+
+        request(chunk) returns the response or the exception raised. When
+        a single instrument, or both halves of a chunk, fail the exception
+        is returned in place of the response.
+        """
+        steps = self._bisections(chunk)
+        try:
+            chunks = next(steps)
+            while True:
+                chunks = steps.send([request(c) for c in chunks])
+        except StopIteration as stop:
+            return stop.value
+
+    async def afetch(self, chunk, request):
+        """Async version of fetch() with a coroutine function request"""
+        import asyncio
+
+        steps = self._bisections(chunk)
+        try:
+            chunks = next(steps)
+            while True:
+                responses = await asyncio.gather(*(request(c) for c in chunks))
+                chunks = steps.send(list(responses))
+        except StopIteration as stop:
+            return stop.value
+
+    def _bisections(self, chunk):
+        """
+        Generate lists of chunks to request, sent back their responses
+
+        Shared by fetch() and afetch(), returns (chunk, response) pairs.
+        """
+        (resp,) = yield [chunk]
+        if not isinstance(resp, Exception):
+            return [(chunk, resp)]
+        return (yield from self._resolve(chunk, resp))
+
+    def _resolve(self, chunk, error):
+        halves = self.bisect(chunk)
+        if halves is None:
+            return [(chunk, error)]
+        results = list(zip(halves, (yield halves)))
+        # both halves failing is not caused by a bad instrument
+        if all(isinstance(resp, Exception) for _, resp in results):
+            return results
+        pairs = []
+        for half, resp in results:
+            if isinstance(resp, Exception):
+                pairs += yield from self._resolve(half, resp)
+            else:
+                pairs.append((half, resp))
+        return pairs
+
+    @staticmethod
+    def bisect(chunk):
+        """Return halves of a chunk, None for a single instrument"""
+        symbols, codes = chunk
+        codes = codes.split(";")
+        if len(codes) < 2:
+            return None
+        half = len(codes) // 2
+        return [
+            (symbols[:half], ";".join(codes[:half])),
+            (symbols[half:], ";".join(codes[half:])),
+        ]
+
+
+def _chunksize(chunksize):
+    if chunksize == "auto":
+        return chunksize
+    try:
+        return max(1, int(chunksize))
+    except (TypeError, ValueError):
+        raise ValueError(
+            "Invalid chunksize: valid values are 'auto' and int."
+        ) from None
@@ -0,0 +1,162 @@
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# record of the reader call running in the current thread or task
+_current = ContextVar("tse_index_call", default=None)
+
+
+class Metrics:
+    """
+    Collector of stage timings and counters of reader calls
+
+    Totals are kept by name and labels. Each top level call, such as
+    history(), also gets a record of its own stages and counters which is
+    passed to hooks when the call finishes. Records follow the call into
+    worker threads and asyncio tasks through a context variable.
+
+    Stages:
+        request       network round-trip and streamed SOAP extraction,
+                      including pauses between retries, labelled by action
+        parse         parsing closing prices into column arrays
+        merge         merging parsed chunks into history and store
+        adjust        price adjustment and resampling of results
+        instruments   parsing and merging the instrument list
+        shares        updating the share change ledger
+
+    Counters:
+        requests, retries, request_bytes, response_bytes, rows
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._hooks = []
+
+    def add_hook(self, hook):
+        """
+        Register hook(record) called with a dict after each reader call
+
+        record has 'call' name, 'seconds', 'stages' {stage: seconds} and
+        'counters' {name: value}.
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        record = _current.get()
+        with self._lock:
+            self._totals[key] = self._totals.get(key, 0) + value
+            if record is None:
+                return
+            if name == "stage_seconds":
+                stages = record["stages"]
+                stages[labels["stage"]] = stages.get(labels["stage"], 0) + value
+            elif name not in ("stage_calls", "calls", "call_seconds"):
+                counters = record["counters"]
+                counters[name] = counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """Time body of with statement as a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.count(
+                "stage_seconds", time.perf_counter() - start, stage=name, **labels
+            )
+            self.count("stage_calls", 1, stage=name, **labels)
+
+    @contextmanager
+    def call(self, name):
+        """
+        Collect a record of a reader call
+
+        Calls nested in another call, like instruments() in history(), are
+        part of the outer record.
+        """
+        if _current.get() is not None:
+            yield _current.get()
+            return
+        record = {"call": name, "seconds": 0.0, "stages": {}, "counters": {}}
+        token = _current.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            _current.reset(token)
+            record["seconds"] = time.perf_counter() - start
+            self.count("calls", 1, call=name)
+            self.count("call_seconds", record["seconds"], call=name)
+            for hook in list(self._hooks):
+                hook(record)
+
+    def snapshot(self):
+        """Return list of (name, labels, value) of totals"""
+        with self._lock:
+            items = sorted(self._totals.items(), key=lambda i: i[0])
+        return [(name, dict(labels), value) for (name, labels), value in items]
+
+    def reset(self):
+        with self._lock:
+            self._totals = {}
+
+    def to_prometheus(self, prefix="tse_index"):
+        """Return totals in Prometheus text exposition format"""
+        lines = []
+        lastName = None
+        for name, labels, value in self.snapshot():
+            metric = f"{prefix}_{name}_total"
+            if name != lastName:
+                lines.append(f"# TYPE {metric} counter")
+                lastName = name
+            if labels:
+                text = ",".join(
+                    '{}="{}"'.format(
+                        k, str(v).replace("\\", "\\\\").replace('"', '\\"')
+                    )
+                    for k, v in labels.items()
+                )
+                metric += "{" + text + "}"
+            value = int(value) if value == int(value) else float(value)
+            lines.append(f"{metric} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+def _recorded(name):
+    """Decorate a reader method to collect a record of its calls"""
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                with self.metrics.call(name):
+                    return await method(self, *args, **kwargs)
+
+        elif inspect.isgeneratorfunction(method):
+            # record is open from the first step until generator is done
+            # or closed
+
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                with self.metrics.call(name):
+                    yield from method(self, *args, **kwargs)
+
+        else:
+
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                with self.metrics.call(name):
+                    return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
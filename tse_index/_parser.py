@@ -0,0 +1,74 @@
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from tse_index import settings
+
+_TSE_FIELD_DTYPE = {
+    "ID": np.int64,
+    "Date": np.int64,
+    "Count": np.int64,
+}
+
+
+def _parse_closing_prices(data: str, insCodes=()):
+    """
+    Parse closing prices response of a whole chunk in one pass
+
+    Records of all instruments are read by a single parser call into typed
+    column arrays, rows with zero trade count are dropped and remaining
+    rows are split by 'ID' column.
+
+    Parameters
+    ----------
+    data : str
+        Response of TSEClient.DecompressAndGetInsturmentClosingPrice,
+        records are separated by ";" and instruments by "@".
+    insCodes : iterable of int
+        Requested instrument ids. Each of them has an entry in result even
+        if response has no record for it.
+
+    Returns
+    -------
+    dict
+        {insCode: {column: np.ndarray}} with columns in
+        settings._TSE_FIELD_ORDER and rows sorted by date.
+    """
+    result = {
+        int(i): {c: np.empty(0, _TSE_FIELD_DTYPE.get(c, np.float64))
+                 for c in settings._TSE_FIELD_ORDER}
+        for i in insCodes
+    }
+    text = data.replace("@", ";").strip(";") if data else ""
+    if not text:
+        return result
+
+    frame = pd.read_csv(
+        StringIO(text),
+        lineterminator=";",
+        sep=",",
+        names=settings._TSE_FIELD,
+        dtype={c: _TSE_FIELD_DTYPE.get(c, np.float64) for c in settings._TSE_FIELD},
+    )
+    columns = {c: frame[c].to_numpy() for c in settings._TSE_FIELD}
+    mask = columns["Count"] != 0
+    # stable sort by ID then date keeps order of records per instrument
+    order = np.lexsort((columns["Date"][mask], columns["ID"][mask]))
+    ids = columns["ID"][mask][order]
+    bounds = np.flatnonzero(np.diff(ids)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(ids)]))
+    sorted_columns = {
+        c: columns[c][mask][order] for c in settings._TSE_FIELD_ORDER
+    }
+    for s, e in zip(starts, ends):
+        if s == e:
+            continue
+        result[int(ids[s])] = {c: v[s:e] for c, v in sorted_columns.items()}
+    return result
+
+
+def _to_frame(columns):
+    """Build history DataFrame from column arrays of _parse_closing_prices"""
+    return pd.DataFrame(columns, columns=settings._TSE_FIELD_ORDER, copy=False)
@@ -0,0 +1,178 @@
+from functools import lru_cache
+
+import datetime as dt
+import jdatetime as jt
+import numpy as np
+import pandas as pd
+
+INTERVALS = ["d", "w", "m", "jw", "jm", "jy"]
+
+# aggregation of each history column
+_AGGREGATE = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Count": "sum",
+    "Volume": "sum",
+    "Value": "sum",
+    "AdjClose": "last",
+    "Yesterday": "first",
+}
+
+
+@lru_cache(maxsize=None)
+def _jalali_end(ordinal, interval):
+    """Return ordinal of last day of jalali week/month/year of a day"""
+    day = dt.date.fromordinal(ordinal)
+    if interval == "jw":
+        # jalali week starts on saturday and ends on friday
+        return ordinal + (4 - day.weekday()) % 7
+    jday = jt.date.fromgregorian(date=day)
+    if interval == "jm":
+        if jday.month == 12:
+            nextStart = jt.date(jday.year + 1, 1, 1)
+        else:
+            nextStart = jt.date(jday.year, jday.month + 1, 1)
+    else:
+        nextStart = jt.date(jday.year + 1, 1, 1)
+    return nextStart.togregorian().toordinal() - 1
+
+
+def _period_labels(days, interval):
+    """
+    Return label of period of each day
+
+    Labels are the last day of period, like right labels of
+    pd.DataFrame.resample.
+
+    Parameters
+    ----------
+    days : np.ndarray of datetime64[D]
+    interval : str
+        One of INTERVALS; 'w' is a week ending on saturday and 'm' a
+        gregorian month, 'jw', 'jm' and 'jy' are jalali week, month and
+        year.
+    """
+    days = np.asarray(days, dtype="datetime64[D]")
+    if interval == "d":
+        return days
+    if interval == "w":
+        # 1970-01-01 is thursday, saturday is two days later
+        offset = (2 - days.astype(np.int64)) % 7
+        return days + offset.astype("timedelta64[D]")
+    if interval == "m":
+        return (days.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+    unique, inverse = np.unique(days, return_inverse=True)
+    epoch = dt.date(1970, 1, 1).toordinal()
+    ends = np.array(
+        [_jalali_end(int(d) + epoch, interval) - epoch
+         for d in unique.astype(np.int64)],
+        dtype=np.int64,
+    )
+    return ends.astype("datetime64[D]")[inverse.reshape(-1)]
+
+
+def _resample_arrays(dates, groups, values, interval):
+    """
+    Aggregate rows of many histories into periods in one pass
+
+    Rows must be sorted by group and date. Each run of rows with the same
+    group and period label is reduced with np.ufunc.reduceat.
+
+    Parameters
+    ----------
+    dates : np.ndarray of datetime64
+    groups : np.ndarray of int
+        Group (symbol) of each row.
+    values : dict
+        {column: np.ndarray}; columns are aggregated by _AGGREGATE.
+    interval : str
+
+    Returns
+    -------
+    labels, groups, values
+        Period label and group of each aggregated row and aggregated
+        columns.
+    """
+    labels = _period_labels(dates, interval)
+    n = len(labels)
+    if n == 0:
+        return labels, groups, values
+    change = np.ones(n, dtype=bool)
+    change[1:] = (labels[1:] != labels[:-1]) | (groups[1:] != groups[:-1])
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:], n) - 1
+    result = {}
+    for column, v in values.items():
+        how = _AGGREGATE.get(column, "last")
+        v = np.asarray(v)
+        if how == "first":
+            result[column] = v[starts]
+        elif how == "last":
+            result[column] = v[ends]
+        elif how == "max":
+            result[column] = np.maximum.reduceat(v, starts)
+        elif how == "min":
+            result[column] = np.minimum.reduceat(v, starts)
+        else:
+            result[column] = np.add.reduceat(v, starts)
+    return labels[starts], groups[starts], result
+
+
+def _resample_frames(frames, interval):
+    """
+    Resample many date indexed histories with a single grouped pass
+
+    Periods without record between first and last record of a history are
+    kept, with NaN prices and zero sums, as pd.DataFrame.resample does.
+
+    Parameters
+    ----------
+    frames : dict
+        {key: pd.DataFrame} indexed by date. None values are kept.
+    interval : str
+
+    Returns
+    -------
+    dict
+        {key: pd.DataFrame} indexed by period label.
+    """
+    keys = [k for k in frames if frames[k] is not None and not frames[k].empty]
+    result = {k: frames[k] for k in frames}
+    if interval == "d" or not keys:
+        return result
+    columns = list(frames[keys[0]].columns)
+    lengths = [len(frames[k]) for k in keys]
+    labels, groups, values = _resample_arrays(
+        np.concatenate(
+            [frames[k].index.to_numpy().astype("datetime64[D]") for k in keys]
+        ),
+        np.repeat(np.arange(len(keys)), lengths),
+        {
+            c: np.concatenate([frames[k][c].to_numpy() for k in keys])
+            for c in columns
+        },
+        interval,
+    )
+    bounds = np.searchsorted(groups, np.arange(len(keys) + 1))
+    for j, k in enumerate(keys):
+        s, e = bounds[j], bounds[j + 1]
+        index = pd.DatetimeIndex(
+            labels[s:e].astype("datetime64[ns]"), name=frames[k].index.name
+        )
+        frame = pd.DataFrame(
+            {c: values[c][s:e] for c in columns}, index=index, columns=columns
+        )
+        days = np.arange(labels[s], labels[e - 1] + 1, dtype="datetime64[D]")
+        allLabels = np.unique(_period_labels(days, interval))
+        if len(allLabels) != len(frame):
+            frame = frame.reindex(
+                pd.DatetimeIndex(
+                    allLabels.astype("datetime64[ns]"), name=frames[k].index.name
+                )
+            )
+            sums = [c for c in columns if _AGGREGATE.get(c) == "sum"]
+            frame[sums] = frame[sums].fillna(0)
+        result[k] = frame
+    return result
@@ -0,0 +1,133 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from tse_index._utils import _replace_arabic
+
+_SEARCH_FIELDS = ("symbol", "enSymbol", "name", "coName")
+
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+
+def _normalize(text):
+    """Normalize persian text for search"""
+    text = _replace_arabic(text).translate(_DIGITS).replace("‌", " ")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class _SearchIndex:
+    """
+    Prebuilt search index of instruments
+
+    Normalized texts of _SEARCH_FIELDS are indexed by their bigrams and
+    trigrams, and single characters are looked up by scanning texts, so
+    terms of any length match as substrings. Candidates are verified and
+    ranked by field, kind of match (exact, prefix, word prefix, substring),
+    text length and recency of instrument.
+
+    Parameters
+    ----------
+    instruments : pd.DataFrame
+        Instrument list; results are row positions of this frame.
+    """
+
+    def __init__(self, instruments):
+        self.fields = [f for f in _SEARCH_FIELDS if f in instruments]
+        self.size = len(instruments)
+        self.dates = (
+            instruments["date"].to_numpy()
+            if "date" in instruments
+            else np.zeros(self.size)
+        )
+        self.texts = {}
+        self.grams = {}
+        for field in self.fields:
+            texts = [
+                _normalize(t) if isinstance(t, str) else ""
+                for t in instruments[field].tolist()
+            ]
+            grams = defaultdict(set)
+            for row, text in enumerate(texts):
+                for n in (2, 3):
+                    for i in range(len(text) - n + 1):
+                        grams[text[i : i + n]].add(row)
+            self.texts[field] = texts
+            self.grams[field] = {
+                g: np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+                for g, rows in grams.items()
+            }
+
+    def _candidates(self, field, term):
+        """Rows of field which may contain term"""
+        if len(term) < 2:
+            return np.array(
+                [r for r, text in enumerate(self.texts[field]) if term in text],
+                dtype=np.int64,
+            )
+        n = min(len(term), 3)
+        rows = None
+        for i in range(len(term) - n + 1):
+            posting = self.grams[field].get(term[i : i + n])
+            if posting is None:
+                return np.empty(0, dtype=np.int64)
+            rows = posting if rows is None else np.intersect1d(
+                rows, posting, assume_unique=True
+            )
+        return rows
+
+    @staticmethod
+    def _match(text, terms, query):
+        """Return rank of match kind, None if terms are not in text in order"""
+        pos = 0
+        for term in terms:
+            pos = text.find(term, pos)
+            if pos < 0:
+                return None
+            pos += len(term)
+        if text == query:
+            return 0
+        if text.startswith(query):
+            return 1
+        if text.startswith(terms[0]) or f" {terms[0]}" in text:
+            return 2
+        return 3
+
+    def search(self, query, fields=None, mask=None, top=None):
+        """
+        Return ranked row positions of instruments matching query
+
+        Parameters
+        ----------
+        query : str
+            Words to search; all of them must appear in one field in order.
+        fields : list of str, default None
+            Fields to search in, default is all of _SEARCH_FIELDS.
+        mask : np.ndarray of bool, default None
+            Rows allowed in result.
+        top : int, default None
+            Maximum number of results, None returns all matches.
+        """
+        query = _normalize(query)
+        fields = [f for f in (fields or self.fields) if f in self.texts]
+        if not query:
+            rows = np.arange(self.size)
+            if mask is not None:
+                rows = rows[mask]
+            return list(rows[:top])
+        terms = query.split(" ")
+        best = {}
+        for rank, field in enumerate(fields):
+            texts = self.texts[field]
+            # the longest term is the most selective one
+            for row in self._candidates(field, max(terms, key=len)).tolist():
+                if mask is not None and not mask[row]:
+                    continue
+                kind = self._match(texts[row], terms, query)
+                if kind is None:
+                    continue
+                score = (kind, rank, len(texts[row]), -self.dates[row], row)
+                if row not in best or score < best[row]:
+                    best[row] = score
+        rows = sorted(best, key=best.get)
+        return rows[:top] if top is not None else rows
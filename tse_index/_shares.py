@@ -0,0 +1,125 @@
+import threading
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from tse_index import settings
+
+_SHARE_DTYPE = np.dtype(
+    [
+        ("Idn", np.int64),
+        ("InsCode", np.int64),
+        ("DEven", np.int64),
+        ("NumberOfShareNew", np.float64),
+        ("NumberOfShareOld", np.float64),
+    ]
+)
+
+
+class _ShareLedger:
+    """
+    Ledger of share count changes of instruments
+
+    Records of TSEClient.InstrumentAndShare are kept sorted by their 'Idn'
+    cursor and appended to a file of fixed size records, so each update
+    only requests changes after the last known id. Adjustment factors of
+    each instrument are precomputed from the ledger. Methods are
+    thread-safe.
+
+    Parameters
+    ----------
+    path : str or Path, default None
+        Directory to persist the ledger in, None keeps it in memory.
+    """
+
+    _FILE = "shares.dat"
+
+    def __init__(self, path=None):
+        self.file = None if path is None else Path(path) / self._FILE
+        self.records = np.empty(0, _SHARE_DTYPE)
+        if self.file is not None and self.file.exists():
+            self.records = np.fromfile(self.file, dtype=_SHARE_DTYPE)
+        self._factors = None
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return int(self.records["Idn"][-1]) if len(self.records) else 0
+
+    def update(self, data: str):
+        """
+        Add share records of an InstrumentAndShare response
+
+        Returns number of new records.
+        """
+        shares = data.split("@")[1] if "@" in data else ""
+        shares = shares.strip(";")
+        if not shares:
+            return 0
+        frame = pd.read_csv(
+            StringIO(shares),
+            lineterminator=";",
+            sep=",",
+            names=settings._TSE_SHARE_FIELD,
+        )
+        with self._lock:
+            frame = frame[frame["Idn"] > self.last_id].sort_values("Idn")
+            if frame.empty:
+                return 0
+            records = np.empty(len(frame), _SHARE_DTYPE)
+            for c in _SHARE_DTYPE.names:
+                records[c] = frame[c].to_numpy()
+            if self.file is not None:
+                self.file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.file, "ab") as f:
+                    f.write(records.tobytes())
+            self.records = np.concatenate([self.records, records])
+            self._factors = None
+            return len(records)
+
+    def _build(self):
+        """Precompute (dates, cumulative factors) of each instrument"""
+        factors = {}
+        # records are replaced, never modified, by update()
+        records = self.records[np.lexsort((self.records["Idn"], self.records["DEven"],
+                                           self.records["InsCode"]))]
+        codes = records["InsCode"]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        for part in np.split(records, bounds):
+            if not len(part):
+                continue
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = part["NumberOfShareOld"] / part["NumberOfShareNew"]
+            ratio[~np.isfinite(ratio) | (ratio <= 0)] = 1.0
+            cumulative = np.append(np.cumprod(ratio[::-1])[::-1], 1.0)
+            factors[int(part["InsCode"][0])] = (part["DEven"], cumulative)
+        return factors
+
+    def factors(self, insCode):
+        """
+        Return (dates, factors) of an instrument
+
+        factors[k] is the multiplier of prices before dates[k]; the last
+        item is 1 for prices after all of changes.
+        """
+        with self._lock:
+            if self._factors is None:
+                self._factors = self._build()
+            factors = self._factors
+        return factors.get(
+            int(insCode), (np.empty(0, np.int64), np.ones(1))
+        )
+
+    def factor(self, insCodes, dates):
+        """Return adjustment factor of each date of instruments"""
+        dates = np.asarray(dates)
+        result = np.ones(len(dates))
+        for insCode in insCodes:
+            eventDates, cumulative = self.factors(insCode)
+            if len(eventDates):
+                result *= cumulative[
+                    np.searchsorted(eventDates, dates, side="right")
+                ]
+        return result
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+
+class _Flight:
+    """A call in flight which other callers wait for"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._waiters = []
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self._event.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_set_done, future)
+
+    def wait(self):
+        self._event.wait()
+        return self._outcome()
+
+    async def await_(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._event.is_set():
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            else:
+                future = None
+        if future is not None:
+            await future
+        return self._outcome()
+
+    def _outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one in-flight call
+
+    The first caller of a key runs the call and later callers, in other
+    threads or asyncio tasks, wait for it and share its result or error.
+    Keys are released as soon as the call finishes, so results are not
+    cached here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def _acquire(self, key):
+        """Return (flight, True if caller leads the call)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _release(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(result, error)
+
+    def do(self, key, func):
+        """Call func() once for concurrent callers of key"""
+        flight, leader = self._acquire(key)
+        if not leader:
+            return flight.wait()
+        try:
+            result = func()
+        except BaseException as e:
+            self._release(key, flight, error=e)
+            raise
+        self._release(key, flight, result)
+        return result
+
+    async def ado(self, key, func):
+        """Async version of do(), func() returns an awaitable"""
+        flight, leader = self._acquire(key)
+        if not leader:
+            return await flight.await_()
+        try:
+            result = await func()
+        except BaseException as e:
+            self._release(key, flight, error=e)
+            raise
+        self._release(key, flight, result)
+        return result
+
+    def claim(self, keys):
+        """
+        Lead calls of all of keys if none of them is in flight
+
+        Returns (owned, flights). When a key is led by another caller
+        nothing is claimed, owned is None and flights are the calls to
+        wait for before claiming again. Claiming all keys at once never
+        holds a key while waiting for another, so callers cannot deadlock.
+        """
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            others = [self._flights[k] for k in keys if k in self._flights]
+            if others:
+                return None, others
+            owned = {k: _Flight() for k in keys}
+            self._flights.update(owned)
+        return owned, []
+
+    def release(self, owned):
+        for key, flight in owned.items():
+            self._release(key, flight)
+
+    @contextmanager
+    def hold(self, keys):
+        """Wait for in-flight calls of keys, then lead calls of all of them"""
+        while True:
+            owned, flights = self.claim(keys)
+            if owned is not None:
+                break
+            for flight in flights:
+                flight.wait()
+        try:
+            yield
+        finally:
+            self.release(owned)
+
+    @asynccontextmanager
+    async def ahold(self, keys):
+        """Async version of hold()"""
+        while True:
+            owned, flights = self.claim(keys)
+            if owned is not None:
+                break
+            for flight in flights:
+                await flight.await_()
+        try:
+            yield
+        finally:
+            self.release(owned)
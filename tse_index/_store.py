@@ -0,0 +1,137 @@
+import os
+import threading
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from tse_index import settings
+
+_HISTORY_DTYPE = np.dtype(
+    [
+        ("Date", np.int64),
+        ("Open", np.float64),
+        ("High", np.float64),
+        ("Low", np.float64),
+        ("Close", np.float64),
+        ("Count", np.int64),
+        ("Volume", np.float64),
+        ("Value", np.float64),
+        ("AdjClose", np.float64),
+        ("Yesterday", np.float64),
+    ]
+)
+
+
+class _HistoryStore:
+    """
+    On-disk columnar store of instrument histories
+
+    History of each symbol is kept in a file of fixed size records
+    (_HISTORY_DTYPE) sorted by date. Files are read through a memory map
+    and new records are appended to the end of file, so an update never
+    rewrites the stored history.
+
+    Parameters
+    ----------
+    path : str or Path
+        Directory of the store. It is created if does not exist.
+    """
+
+    _SUFFIX = ".dat"
+    _INSTRUMENTS = "instruments.pkl"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # appends and reads of a file must not interleave between threads
+        self._lock = threading.RLock()
+
+    def _file(self, symbol):
+        return self.path / f"{quote(str(symbol), safe='')}{self._SUFFIX}"
+
+    def __contains__(self, symbol):
+        return self._file(symbol).exists()
+
+    def _records(self, symbol):
+        file = self._file(symbol)
+        if not file.exists():
+            return np.empty(0, _HISTORY_DTYPE)
+        count = file.stat().st_size // _HISTORY_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, _HISTORY_DTYPE)
+        # a trailing partial record of an interrupted append is ignored
+        return np.memmap(file, dtype=_HISTORY_DTYPE, mode="r", shape=(count,))
+
+    def _truncate(self, symbol):
+        """Cut a trailing partial record left by an interrupted append"""
+        file = self._file(symbol)
+        if file.exists():
+            size = file.stat().st_size
+            whole = size - size % _HISTORY_DTYPE.itemsize
+            if whole != size:
+                os.truncate(file, whole)
+
+    def last_date(self, symbol):
+        """Return max stored Date of symbol, 0 if nothing is stored"""
+        records = self._records(symbol)
+        return int(records["Date"][-1]) if len(records) else 0
+
+    def load(self, symbol):
+        """Return stored history of symbol as DataFrame, None if missing"""
+        with self._lock:
+            if symbol not in self:
+                return None
+            records = self._records(symbol)
+            return pd.DataFrame(
+                {c: np.array(records[c]) for c in settings._TSE_FIELD_ORDER},
+                columns=settings._TSE_FIELD_ORDER,
+            )
+
+    def append(self, symbol, hist_data):
+        """
+        Store rows of hist_data after the stored max Date
+
+        hist_data can be the whole history of symbol; only its new rows
+        are written.
+        """
+        if hist_data is None:
+            return
+        with self._lock:
+            self._truncate(symbol)
+            last = self.last_date(symbol)
+            rows = hist_data[hist_data.Date > last]
+            if rows.empty and symbol in self:
+                return
+            with open(self._file(symbol), "ab") as f:
+                f.write(self._to_records(rows).tobytes())
+
+    def write(self, symbol, hist_data):
+        """Replace stored history of symbol with hist_data"""
+        file = self._file(symbol)
+        tmp = file.with_suffix(".tmp")
+        with self._lock:
+            with open(tmp, "wb") as f:
+                f.write(self._to_records(hist_data).tobytes())
+            os.replace(tmp, file)
+
+    @staticmethod
+    def _to_records(hist_data):
+        records = np.empty(len(hist_data), _HISTORY_DTYPE)
+        for c in _HISTORY_DTYPE.names:
+            records[c] = hist_data[c].to_numpy()
+        return records
+
+    def load_instruments(self):
+        """Return (checked date, instrument list) of catalog cache"""
+        file = self.path / self._INSTRUMENTS
+        if not file.exists():
+            return 0, None
+        return pd.read_pickle(file)
+
+    def write_instruments(self, checked, instruments):
+        file = self.path / self._INSTRUMENTS
+        tmp = file.with_suffix(".tmp")
+        pd.to_pickle((checked, instruments), tmp)
+        os.replace(tmp, file)
@@ -0,0 +1,265 @@
+import base64
+import gzip
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import requests
+
+from tse_index._utils import _init_session
+from tse_index.tse_scrapper import _SoapResult
+
+_ENVELOPE = (
+    '<?xml version="1.0" encoding="utf-8"?><soap:Envelope '
+    'xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xmlns:xsd="http://www.w3.org/2001/XMLSchema"><soap:Body>'
+    '<{0}Response xmlns="http://tsetmc.com/"><{0}Result>{1}</{0}Result>'
+    "</{0}Response></soap:Body></soap:Envelope>"
+)
+
+# position of DEven in an Instrument record
+_INSTRUMENT_DEVEN = 8
+
+
+def _soap_action(headers):
+    action = (headers or {}).get("SOAPAction", "")
+    return action.strip('"').rpartition("/")[2]
+
+
+def _soap_arguments(body):
+    """Return {tag: text} of simple elements of a SOAP request body"""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    return dict(re.findall(r"<(\w+)>([^<]*)</\1>", body or ""))
+
+
+def _decode_ins_codes(insCodes):
+    """Reverse of TSEClient._closing_price_request encoding"""
+    raw = base64.b64decode(insCodes)
+    length = struct.unpack("<L", raw[:4])[0]
+    return zlib.decompress(raw[4:], 16 + zlib.MAX_WBITS)[:length].decode("ascii")
+
+
+def _response(url, text, status=200):
+    response = requests.models.Response()
+    response.status_code = status
+    response.url = url
+    response._content = text.encode("utf-8")
+    response._content_consumed = True
+    response.encoding = "utf-8"
+    return response
+
+
+class Fixture:
+    """
+    Recorded payloads of tsetmc.com web service
+
+    Results are kept per request type. Closing prices are kept per
+    instrument and Instrument and share records are filtered by the
+    arguments of each request, so a fixture answers requests of any chunk
+    size or last date, not only the exact requests it was recorded from.
+
+    Parameters
+    ----------
+    path : str or Path, default None
+        gzipped JSON file of fixture. It is loaded when it exists.
+    """
+
+    def __init__(self, path=None):
+        self.path = None if path is None else Path(path)
+        self.instruments = ""
+        self.shares = ""
+        self.lastPossibleDeven = ""
+        self.closing = {}
+        self.pages = {}
+        if self.path is not None and self.path.exists():
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            self.instruments = data.get("instruments", "")
+            self.shares = data.get("shares", "")
+            self.lastPossibleDeven = data.get("lastPossibleDeven", "")
+            self.closing = data.get("closing", {})
+            self.pages = data.get("pages", {})
+
+    def save(self, path=None):
+        path = Path(path or self.path)
+        data = {
+            "instruments": self.instruments,
+            "shares": self.shares,
+            "lastPossibleDeven": self.lastPossibleDeven,
+            "closing": self.closing,
+            "pages": self.pages,
+        }
+        tmp = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _merge_records(old, new, key):
+        records = {key(r): r for r in old.split(";") if r}
+        records.update((key(r), r) for r in new.split(";") if r)
+        return ";".join(records.values())
+
+    def add_instruments(self, text):
+        self.instruments = self._merge_records(
+            self.instruments, text, lambda r: r.split(",", 1)[0]
+        )
+
+    def add_shares(self, text):
+        self.shares = self._merge_records(
+            self.shares, text, lambda r: r.split(",", 1)[0]
+        )
+
+    def add_closing_prices(self, text):
+        for record in text.replace("@", ";").split(";"):
+            if record:
+                insCode, deven, _ = record.split(",", 2)
+                self.closing.setdefault(insCode, {})[deven] = record
+
+    def instrument(self, insLastDate="0"):
+        return ";".join(
+            r for r in self.instruments.split(";")
+            if r and int(r.split(",")[_INSTRUMENT_DEVEN]) > int(insLastDate)
+        )
+
+    def instrument_and_share(self, insLastDate="0", lastID=0):
+        shares = ";".join(
+            r for r in self.shares.split(";")
+            if r and int(r.split(",", 1)[0]) > int(lastID)
+        )
+        return self.instrument(insLastDate) + "@" + shares
+
+    def closing_prices(self, insCodesList):
+        result = []
+        for code in insCodesList.split(";"):
+            insCode, deven, _ = code.split(",")
+            records = self.closing.get(insCode, {})
+            result.append(";".join(
+                records[d] for d in sorted(records, key=int)
+                if int(d) > int(deven)
+            ))
+        return "@".join(result)
+
+    def answer(self, action, arguments):
+        """Return result of a SOAP action with request arguments"""
+        if action == "Instrument":
+            return self.instrument(arguments.get("DEven", "0"))
+        if action == "InstrumentAndShare":
+            return self.instrument_and_share(
+                arguments.get("DEven", "0"), arguments.get("LastID", 0)
+            )
+        if action == "LastPossibleDeven":
+            return self.lastPossibleDeven
+        if action == "DecompressAndGetInsturmentClosingPrice":
+            return self.closing_prices(_decode_ins_codes(arguments["insCodes"]))
+        raise KeyError(action)
+
+    def record(self, action, arguments, result):
+        """Add result of a SOAP action to fixture"""
+        if action == "Instrument":
+            self.add_instruments(result)
+        elif action == "InstrumentAndShare":
+            instruments, _, shares = result.partition("@")
+            self.add_instruments(instruments)
+            self.add_shares(shares)
+        elif action == "LastPossibleDeven":
+            self.lastPossibleDeven = result
+        elif action == "DecompressAndGetInsturmentClosingPrice":
+            self.add_closing_prices(result)
+
+
+class ReplaySession(requests.Session):
+    """
+    Session that answers requests of TSEClient from a Fixture offline
+
+    Pass it as session of TSEClient or reader to work without network.
+    Requests missing from fixture are answered with HTTP 404.
+
+    Parameters
+    ----------
+    fixture : Fixture, str or Path
+        Fixture or path of a recorded fixture file.
+    """
+
+    def __init__(self, fixture):
+        super().__init__()
+        if not isinstance(fixture, Fixture):
+            fixture = Fixture(fixture)
+        self.fixture = fixture
+        self.calls = 0
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        self.calls += 1
+        if method.upper() == "GET":
+            if url not in self.fixture.pages:
+                return _response(url, "not recorded", 404)
+            return _response(url, self.fixture.pages[url])
+        action = _soap_action(headers)
+        try:
+            result = self.fixture.answer(action, _soap_arguments(data))
+        except KeyError:
+            return _response(url, "not recorded", 404)
+        return _response(url, _ENVELOPE.format(action, escape(result)))
+
+
+class RecordSession(requests.Session):
+    """
+    Session that records responses of a real session into a Fixture
+
+    Parameters
+    ----------
+    path : str or Path
+        File of fixture. Existing records are kept and updated. The file
+        is written by save() and on close(), so use the session as a
+        context manager or close it when recording is done.
+    session : Session, default None
+        Session used to send requests.
+    """
+
+    def __init__(self, path, session=None):
+        super().__init__()
+        self.fixture = Fixture(path)
+        self.session = _init_session(session)
+        self._lock = threading.Lock()
+        self._changed = False
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        kwargs.pop("stream", None)
+        response = self.session.request(
+            method, url, data=data, headers=headers, **kwargs
+        )
+        if response.status_code != requests.codes.ok:
+            return response
+        if method.upper() == "GET":
+            text = response.text
+        else:
+            action = _soap_action(headers)
+            extractor = _SoapResult(action)
+            extractor.feed(response.content)
+            result = extractor.result()
+        with self._lock:
+            if method.upper() == "GET":
+                self.fixture.pages[url] = text
+            else:
+                self.fixture.record(action, _soap_arguments(data), result)
+            self._changed = True
+        return response
+
+    def save(self):
+        """Write recorded responses to the fixture file"""
+        with self._lock:
+            if self._changed:
+                self.fixture.save()
+                self._changed = False
+
+    def close(self):
+        self.save()
+        self.session.close()
+        super().close()
@@ -1,11 +1,9 @@
 import datetime as dt
-import jdatetime as jt
-
-from pandas import to_datetime
-import requests
 
 from numbers import Number
-import numpy as np
+
+# numpy, pandas, requests and jdatetime are imported by functions using them
+# so that importing tse_index and its light helpers stays fast
 
 
 class SymbolWarning(UserWarning):
@@ -29,6 +27,9 @@ def _sanitize_dates(start, end):
     end : str, int, date, datetime, Timestamp
         Desired end date
     """
+    import jdatetime as jt
+    from pandas import to_datetime
+
     if is_number(start):
         if start <= 1600:
             # jalali year
@@ -74,7 +75,184 @@ def _sanitize_dates(start, end):
     return start, end
 
 
+def _adjustment_factors(adjClose, yesterday, first):
+    """
+    Return (factor, adjusted) arrays of price adjustment
+
+    A capital increase/profit sharing happens on row j when 'Yesterday'
+    of j differs from 'AdjClose' of j-1. Prices of row t are multiplied by
+    product of Yesterday[j] / AdjClose[j-1] of all such rows j > t of the
+    same instrument, which is a reverse cumulative product computed in a
+    single pass.
+
+    Parameters
+    ----------
+    adjClose, yesterday : np.ndarray
+        Columns of one or more histories concatenated, sorted by date
+        within each history.
+    first : np.ndarray of bool
+        True on the first row of each history.
+
+    Returns
+    -------
+    factor : np.ndarray
+        Adjustment factor of each row.
+    adjusted : np.ndarray of bool
+        True on rows that precede an adjustment event.
+    """
+    import numpy as np
+    from pandas import Series
+
+    adjClose = np.asarray(adjClose, dtype=np.float64)
+    yesterday = np.asarray(yesterday, dtype=np.float64)
+    first = np.asarray(first, dtype=bool)
+    n = len(adjClose)
+    prev = np.empty(n)
+    prev[1:] = adjClose[:-1]
+    event = ~first
+    event[1:] &= prev[1:] != yesterday[1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(event, yesterday / np.where(event, prev, 1.0), 1.0)
+
+    # reverse cumulative product/sum within each history
+    group = np.cumsum(first)[::-1]
+    cumRatio = (
+        Series(ratio[::-1]).groupby(group).cumprod().to_numpy()[::-1]
+    )
+    cumEvent = (
+        Series(event[::-1].astype(np.int64))
+        .groupby(group).cumsum().to_numpy()[::-1]
+    )
+    # factor of row t uses events after t, last row of a history has none
+    last = np.empty(n, dtype=bool)
+    last[:-1] = first[1:]
+    last[-1:] = True
+    factor = np.ones(n)
+    adjusted = np.zeros(n, dtype=bool)
+    factor[:-1] = cumRatio[1:]
+    adjusted[:-1] = cumEvent[1:] > 0
+    factor[last] = 1.0
+    adjusted[last] = False
+    return factor, adjusted
+
+
+_ADJUST_COLUMNS = ["Open", "High", "Low", "Close", "AdjClose", "Yesterday"]
+
+
+def _apply_factor(data, factor, adjusted, columns=None):
+    """Return copy of data with prices of adjusted rows multiplied by factor"""
+    import numpy as np
+
+    data = data.copy()
+    if adjusted.any():
+        for c in columns or _ADJUST_COLUMNS:
+            values = data[c].to_numpy(dtype=np.float64, copy=True)
+            values[adjusted] = np.round(values[adjusted] * factor[adjusted])
+            data[c] = values
+    return data
+
+
+def _adjust_histories(histories, columns=None):
+    """
+    Adjust historical records of many stocks at once
+
+    Histories are concatenated and adjustment factors of all of them are
+    computed in one vectorized pass, see reader._adjust_price.
+
+    Parameters
+    ----------
+    histories : dict
+        {symbol: pd.DataFrame} of historical records sorted by date.
+    columns: list
+        List of columns to be modifies
+
+    Returns
+    -------
+    dict
+        {symbol: pd.DataFrame} with adjusted historical records.
+    """
+    import numpy as np
+
+    keys = [k for k in histories if histories[k] is not None
+            and not histories[k].empty]
+    result = {k: histories[k] for k in histories if k not in keys}
+    if not keys:
+        return result
+
+    lengths = np.array([len(histories[k]) for k in keys])
+    first = np.zeros(lengths.sum(), dtype=bool)
+    first[np.concatenate(([0], np.cumsum(lengths)[:-1]))] = True
+    factor, adjusted = _adjustment_factors(
+        np.concatenate([histories[k]["AdjClose"].to_numpy() for k in keys]),
+        np.concatenate([histories[k]["Yesterday"].to_numpy() for k in keys]),
+        first,
+    )
+    offset = 0
+    for k, length in zip(keys, lengths):
+        result[k] = _apply_factor(
+            histories[k],
+            factor[offset : offset + length],
+            adjusted[offset : offset + length],
+            columns,
+        )
+        offset += length
+    return {k: result[k] for k in histories}
+
+
+def _downcast(values):
+    """
+    Return values in the smallest of int32/float32 dtype that keeps them
+
+    Arrays are returned unchanged when downcasting would lose anything.
+    """
+    import numpy as np
+
+    values = np.asarray(values)
+    if values.dtype.kind not in "iuf" or len(values) == 0:
+        return values
+    if values.dtype.kind == "f" and np.isnan(values).any():
+        candidates = [np.float32]
+    else:
+        candidates = [np.int32, np.float32]
+    for dtype in candidates:
+        if np.dtype(dtype).itemsize >= values.dtype.itemsize:
+            continue
+        with np.errstate(invalid="ignore", over="ignore"):
+            small = values.astype(dtype)
+        if np.array_equal(small.astype(values.dtype), values):
+            return small
+    return values
+
+
+def _compact_frame(frame, categories=()):
+    """
+    Return frame with downcast numeric columns and categorical categories
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+    categories : list of str
+        Columns of repeated strings to be stored as categorical.
+    """
+    if frame is None:
+        return frame
+    frame = frame.copy()
+    for column in frame.columns:
+        if column in categories:
+            if frame[column].dtype.name != "category":
+                frame[column] = frame[column].astype("category")
+        elif frame[column].dtype.kind in "iuf":
+            frame[column] = _downcast(frame[column].to_numpy())
+    return frame
+
+
+def _replace_arabic(string: str):
+    return string.replace("ك", "ک").replace("ي", "ی")
+
+
 def _init_session(session):
+    import requests
+
     if session is None:
         session = requests.Session()
         # do not set requests max_retries here to support arbitrary pause
@@ -122,4 +300,5 @@ def is_number(obj) -> bool:
     >>> is_number("5")
     False
     """
-    return isinstance(obj, (Number, np.number))
+    # numpy registers its scalar types as numbers.Number
+    return isinstance(obj, Number)
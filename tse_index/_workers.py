@@ -0,0 +1,56 @@
+import pandas as pd
+
+from tse_index._resample import _resample_frames
+from tse_index._utils import _adjust_histories, _apply_factor
+
+# functions run in worker processes of reader take and return picklable
+# values only, so they work with any multiprocessing start method
+
+
+def _derive_views(histories, adjust, factors, start, end, interval):
+    """
+    Adjust, index by date and resample histories
+
+    Parameters
+    ----------
+    histories : dict
+        {symbol: pd.DataFrame} of historical records with 'Date' column.
+    adjust : dict
+        {symbol: adjust_price} of each history, False, True or 'shares'.
+    factors : dict
+        {symbol: np.ndarray} of share change factors of 'shares' histories.
+    start, end : Timestamp
+    interval : str
+
+    Returns
+    -------
+    dict
+        {symbol: pd.DataFrame} of whole adjusted daily histories when
+        interval is 'd', otherwise of resampled histories between start
+        and end.
+    """
+    views = _adjust_histories(
+        {k: h for k, h in histories.items() if adjust[k] is True}
+    )
+    for k, factor in factors.items():
+        views[k] = _apply_factor(histories[k], factor, factor != 1)
+    for k, data in histories.items():
+        data = views.get(k, data).copy()
+        data["Date"] = pd.to_datetime(data["Date"], format="%Y%m%d")
+        views[k] = data.set_index("Date")
+    if interval == "d":
+        return views
+    return _resample_frames(
+        {k: v[start:end] for k, v in views.items()}, interval
+    )
+
+
+def _batches(histories, count):
+    """Split {symbol: DataFrame} into at most count dicts of equal rows"""
+    batches = [{} for _ in range(max(1, count))]
+    rows = [0] * len(batches)
+    for k in sorted(histories, key=lambda k: -len(histories[k])):
+        i = rows.index(min(rows))
+        batches[i][k] = histories[k]
+        rows[i] += len(histories[k])
+    return [b for b in batches if b]
@@ -0,0 +1,93 @@
+import argparse
+import sys
+from pathlib import Path
+
+from tse_index import settings
+from tse_index._chunks import _chunksize
+
+
+def _sync(args):
+    # imported here so that --help does not wait for pandas
+    from tse_index.tse import reader
+
+    store = Path(args.store)
+    checkpoint = args.checkpoint or store / "sync-checkpoint.json"
+    index = reader(
+        store=store,
+        max_workers=args.workers,
+        max_history_rows=args.max_rows,
+        retry_count=args.retry_count,
+        processes=args.processes,
+    )
+    symbols = args.symbols
+    if symbols is None and args.market is not None:
+        instruments = index.instruments()
+        market = "ID" if args.market == "index" else "NO"
+        symbols = list(dict.fromkeys(
+            instruments[instruments.market == market]["symbol"].tolist()
+        ))
+
+    def progress(done, total, chunkSymbols):
+        if not args.quiet:
+            print(
+                f"\r[{done}/{total}] {chunkSymbols[-1]}",
+                end="" if done < total else "\n",
+                file=sys.stderr,
+                flush=True,
+            )
+
+    try:
+        updated = index.sync(
+            symbols,
+            chunksize=args.chunksize,
+            checkpoint=checkpoint,
+            progress=progress,
+        )
+    finally:
+        index.close()
+    if not args.quiet:
+        print(f"{len(updated)} symbols are up to date in {store}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="tse-index", description="Tehran stock exchange data"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    sync = commands.add_parser(
+        "sync", help="fetch histories of all instruments into the store"
+    )
+    sync.add_argument(
+        "--store", default=settings.DATA_BASE_PATH,
+        help="directory of history store (default: %(default)s)",
+    )
+    sync.add_argument("--symbols", nargs="+", help="symbols to sync")
+    sync.add_argument("--market", choices=["index", "normal"])
+    sync.add_argument("--workers", type=int, default=4)
+    sync.add_argument(
+        "--processes", type=int,
+        help="worker processes parsing responses (default: none)",
+    )
+    sync.add_argument(
+        "--chunksize", type=_chunksize, default="auto",
+        help="instruments per request or 'auto' (default: %(default)s)",
+    )
+    sync.add_argument("--retry-count", type=int, default=3)
+    sync.add_argument(
+        "--max-rows", type=int, default=2_000_000,
+        help="history rows kept in memory (default: %(default)s)",
+    )
+    sync.add_argument(
+        "--checkpoint",
+        help="checkpoint file (default: STORE/sync-checkpoint.json)",
+    )
+    sync.add_argument("-q", "--quiet", action="store_true")
+    sync.set_defaults(func=_sync)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,18 @@ _TSE_INS_FIELD = [
     "cat",
 ]
 
+# repeated columns of instrument list stored as categorical in compact mode
+_TSE_INS_CATEGORIES = [
+    "flow",
+    "type",
+    "board",
+    "market",
+    "d",
+    "group",
+    "subgroup",
+    "cat",
+]
+
 _TSE_FIELD = [
     "ID",
     "Date",
@@ -39,6 +51,14 @@ _TSE_FIELD = [
     "Open",
 ]
 
+_TSE_SHARE_FIELD = [
+    "Idn",
+    "InsCode",
+    "DEven",
+    "NumberOfShareNew",
+    "NumberOfShareOld",
+]
+
 _TSE_FIELD_ORDER = [
     "Date",
     "Open",
@@ -1,20 +1,126 @@
-import requests
 import ast
+import json
+import multiprocessing
+import os
+import asyncio
 import re
+import threading
+import time
+import warnings
+import weakref
+import numpy as np
 import pandas as pd
 from io import StringIO
+import contextvars
 import datetime
+import functools
+from contextvars import ContextVar
+from collections import Counter, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from pathlib import Path
 from tse_index import settings
-from tse_index.tse_scrapper import TSEClient
+from tse_index._calendar import _TradingCalendar
+from tse_index._cache import _HistoryCache, _ViewCache
+from tse_index._chunks import (
+    _ChunkScheduler,
+    _check_response,
+    _chunksize,
+)
+from tse_index._metrics import Metrics, _recorded
+from tse_index._parser import _parse_closing_prices, _to_frame
+from tse_index._resample import (
+    INTERVALS,
+    _resample_arrays,
+    _resample_frames,
+)
+from tse_index._search import _SearchIndex
+from tse_index._shares import _ShareLedger
+from tse_index._singleflight import _SingleFlight
+from tse_index._store import _HistoryStore
+from tse_index._workers import _batches, _derive_views
+from tse_index.tse_scrapper import AsyncTSEClient, TSEClient
 from tse_index._utils import (
     RemoteDataError,
     SymbolWarning,
+    _adjust_histories,
+    _adjustment_factors,
+    _apply_factor,
+    _compact_frame,
+    _replace_arabic,
     _init_session,
     _sanitize_dates,
 )
 
 
+class _CallOptions:
+    """Options of a reader call, kept per thread and asyncio task"""
+
+    def __init__(self, chunksize="auto"):
+        self.symbols = None
+        self.start = None
+        self.end = None
+        self.adjust_price = False
+        self.interval = "d"
+        self.chunksize = chunksize
+        # None uses the setting of reader and its clients
+        self.max_workers = None
+        self.retry_count = None
+        self.pause = None
+        # requests of ahistory() in flight, within max_in_flight of aclient
+        self.max_in_flight = None
+
+
+# {reader: _CallOptions} of the current thread and asyncio task, one
+# variable for all of readers, so a reader leaves nothing behind
+_OPTIONS = ContextVar("tse_index_options", default=None)
+
+
+def _call_option(name):
+    def fget(self):
+        return getattr(self._call_options(), name)
+
+    def fset(self, value):
+        setattr(self._call_options(), name, value)
+
+    return property(fget, fset, doc=f"{name} of the current call")
+
+
+def _isolated(method):
+    """
+    Run each step of a generator method in a context of its own
+
+    A generator otherwise runs in the context of whoever resumes it, so
+    a reader call made between two steps would replace options of the
+    generator, and options set by the generator would leak into it.
+    """
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        context = contextvars.copy_context()
+        generator = method(*args, **kwargs)
+        try:
+            while True:
+                try:
+                    item = context.run(next, generator)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            context.run(generator.close)
+
+    return wrapper
+
+
+def _request_counts(requests):
+    """Return Counter of requests of each symbol of _history_requests()"""
+    return Counter(symbol for symbol, _, _ in requests)
+
+
 class reader:
     """
     Tehran stock exchange daily data
@@ -39,48 +145,216 @@ class reader:
         Time, in seconds, of the pause between retries.
     session : Session, default None
         requests.sessions.Session instance to be used.
-    adjust_price : bool, default False
+    chunksize : int or 'auto', default 'auto'
+        Number of instruments requested together. 'auto' sizes chunks by
+        trading days missing from each history and by latency and size
+        of fetched chunks.
+    adjust_price : bool or str, default False
         If True, adjusts all prices in hist_data ('Open', 'High', 'Low',
-        'Close') based on 'Adj Close' and 'Yesterday' price.
+        'Close') based on 'Adj Close' and 'Yesterday' price. If 'shares',
+        adjusts them by the share change ledger of InstrumentAndShare.
     interval: string, d, w, m for daily, weekly, monthly
+        and jw, jm, jy for jalali weekly, monthly, yearly. Resampled
+        histories have the columns of daily ones, Open to Yesterday,
+        instead of lowercase open, high, low and close of Close prices.
+    max_workers : int, default None
+        Number of chunks fetched concurrently. None or 1 fetches
+        chunks one after another.
+    max_in_flight : int, default 10
+        Maximum number of concurrent requests of ahistory() and
+        ainstruments().
+    store : str or Path, default None
+        Directory of on-disk history store. Stored histories are loaded on
+        first request of each symbol and only newer records are fetched
+        and appended to the store.
+    compact : bool, default False
+        Keep histories with int32 dates and losslessly downcast numeric
+        columns, and repeated instrument columns as categorical.
+    cache_size : int, default 128
+        Number of adjusted and resampled history views kept in a LRU
+        cache, 0 disables the cache.
+    max_history_rows, max_history_bytes : int, default None
+        Budget of histories held in memory. Least recently used histories
+        beyond the budget are spilled to the store, or to a temporary
+        directory, and loaded back when requested again.
+    metrics : Metrics, default None
+        Collector of per-stage timings, byte counts, retries and parsed
+        rows of each call. Use reader.metrics.add_hook() to receive a
+        record of each call or reader.metrics.to_prometheus() to export
+        totals.
+    processes : int, default None
+        Number of worker processes which parse fetched chunks and adjust
+        and resample histories of many symbols, so large pulls are not
+        bound to one core. None or 0 does all of work in this process.
+        The pool is started, with spawn, on first use and stopped by
+        close().
+    calendar_ttl : float, default 3600
+        Seconds a fetched last possible deven is used without asking
+        tsetmc again. After that it is fetched again only if the trading
+        calendar, learned from index histories and kept in the store,
+        allows a trading day since, so up to date symbols are served
+        without any request.
+
+    Notes
+    -----
+    A reader can be shared by threads and asyncio tasks. Options of each
+    call are kept per thread and task, and concurrent requests of the same
+    symbol, instrument list, last possible deven or share changes are
+    coalesced into a single in-flight fetch.
     """
 
+    symbols = _call_option("symbols")
+    start = _call_option("start")
+    end = _call_option("end")
+    adjust_price = _call_option("adjust_price")
+    interval = _call_option("interval")
+    chunksize = _call_option("chunksize")
+
     def __init__(
-        self, retry_count=3, pause=0.1, session=None, chunksize=50,
+        self, retry_count=3, pause=0.1, session=None, chunksize="auto",
+        max_workers=None, max_in_flight=10, store=None, compact=False,
+        cache_size=128, max_history_rows=None, max_history_bytes=None,
+        metrics=None, processes=None, calendar_ttl=3600,
     ):
-
-        self.symbols = None
+        self._defaultChunksize = _chunksize(chunksize)
+        self._lock = threading.RLock()
+        self._flights = _SingleFlight()
+        self.processes = processes
+        self._pool = None
 
         # Ladder up the wait time between subsequent requests to improve
         # probability of a successful retry
         self.pause_multiplier = 2.5
-        self.chunksize = max(1, chunksize)
+        self._scheduler = _ChunkScheduler()
+        self.max_workers = max_workers
 
-        self.start = None
-        self.end = None
+        self.metrics = Metrics() if metrics is None else metrics
+        self.client = TSEClient(
+            retry_count=retry_count,
+            pause=pause,
+            session=session,
+            pause_multiplier=self.pause_multiplier,
+            pool_maxsize=max(10, max_workers or 1),
+            metrics=self.metrics,
+            options=self._call_options,
+        )
+        self.aclient = AsyncTSEClient(
+            retry_count=retry_count,
+            pause=pause,
+            pause_multiplier=self.pause_multiplier,
+            limit=max_in_flight,
+            metrics=self.metrics,
+            options=self._call_options,
+        )
+        self.compact = compact
+        self._calendar = _TradingCalendar(store, calendar_ttl)
+        self._symbolIndex = {}
+        self._idIndex = {}
+        self._groupIndex = {}
+        self._groupCodes = {}
+        self.instrumentList = None
+        self._store = None if store is None else _HistoryStore(store)
+        self._history = _HistoryCache(
+            max_history_rows,
+            max_history_bytes,
+            store=self._store,
+            convert=_compact_frame if compact else None,
+        )
+        self._views = _ViewCache(cache_size)
+        self._groups = {}
+        self._instrumentsChecked = 0
+        self._shares = _ShareLedger(store)
+        self._sharesChecked = 0
 
-        self.adjust_price = False
-        self.interval = "d"
+    def _call_options(self):
+        readers = _OPTIONS.get()
+        options = None if readers is None else readers.get(self)
+        if options is None:
+            options = _CallOptions(self._defaultChunksize)
+            self._set_call_options(options)
+        return options
 
-        if self.interval not in ["d", "w", "m"]:
-            raise ValueError("Invalid interval: valid values are 'd', 'w' and 'm'.")
+    def _set_call_options(self, options):
+        # copied on write, as contexts copied from this one share the map
+        readers = weakref.WeakKeyDictionary(_OPTIONS.get() or {})
+        readers[self] = options
+        _OPTIONS.set(readers)
 
-        self.client = TSEClient
-        self.lastPossibleDeven = None
-        self.instrumentList = None
-        self._history = {}
-        self._groups = {}
+    @property
+    def instrumentList(self):
+        return self._instrumentList
+
+    @instrumentList.setter
+    def instrumentList(self, instruments):
+        self._build_indexes(instruments)
+
+    def _build_indexes(self, instruments):
+        """
+        Set instrumentList with its symbol, id and group hash indexes
+
+        Indexes are built before the list is replaced, so concurrent
+        readers see a consistent list and indexes.
+        """
+        if instruments is None or instruments.empty:
+            indexes = {}, {}, {}
+        else:
+            indexes = (
+                instruments.groupby("symbol", sort=False).indices,
+                {
+                    insId: row
+                    for row, insId in enumerate(instruments["id"].tolist())
+                },
+                instruments.groupby("group", sort=False).indices,
+            )
+        with self._lock:
+            self._instrumentList = instruments
+            self._symbolIndex, self._idIndex, self._groupIndex = indexes
+            # search index is built on first search
+            self._searchIndex = None
+
+    def _instrument_rows(self, symbol):
+        """Return rows of instrumentList with given symbol"""
+        with self._lock:
+            rows = self._symbolIndex.get(symbol, [])
+            return self._instrumentList.iloc[rows]
+
+    @property
+    def lastPossibleDeven(self):
+        return self._calendar.lastPossibleDeven
+
+    @lastPossibleDeven.setter
+    def lastPossibleDeven(self, deven):
+        self._calendar.set_last_possible_deven(deven)
 
     def update(self):
-        deven = self.client.LastPossibleDeven()
-        if self.lastPossibleDeven != deven:
-            # TODO update instrument history
-            lastDate = deven.split(";")
-            if len(lastDate) < 2:
-                raise IOError("Last possible date request returned no data")
+        self._update_last_possible_deven()
+        # TODO update instrument history
+        lastDate = self.lastPossibleDeven.split(";")
+        if len(lastDate) < 2:
+            raise IOError("Last possible date request returned no data")
         return True
 
-    def search(self, search, market=None):
+    def search(self, search, market=None, top=None, fields=None):
+        """
+        Search instruments by symbol, name, latin symbol and company name
+
+        Parameters
+        ----------
+        search : str
+            Words to search, arabic letters and digits are normalized.
+        market : str, default None
+            'index' or 'normal' to limit results to a market.
+        top : int, default None
+            Return only top ranked results, None returns all matches.
+        fields : list of str, default None
+            Fields to search in, default is symbol, enSymbol, name and
+            coName.
+
+        Returns
+        -------
+        pd.DataFrame
+            Matching instruments ranked by relevance.
+        """
         if market not in ["index", "normal", None]:
             raise ValueError(
                 "Invalid instrument market: valid values are 'index' and 'normal'."
@@ -92,12 +366,18 @@ class reader:
         instruments = self.instruments()
         if instruments is None:
             return None
-        search = re.sub(r"\s{2,}", " ", search.strip()).replace(" ", ".*")
-        find = instruments[
-            instruments.symbol.str.contains(search)
-            & ((market is None) | (instruments.market == market))
-        ]
-        return find
+        with self._lock:
+            instruments, searchIndex = self._instrumentList, self._searchIndex
+        if searchIndex is None:
+            searchIndex = _SearchIndex(instruments)
+            with self._lock:
+                if self._instrumentList is instruments:
+                    self._searchIndex = searchIndex
+        mask = None
+        if market is not None:
+            mask = (instruments.market == market).to_numpy()
+        rows = searchIndex.search(search, fields, mask, top)
+        return instruments.iloc[rows]
 
     def indices(self):
         instruments = self.instruments()
@@ -105,40 +385,157 @@ class reader:
         indices = indices.drop_duplicates("symbol").sort_index().reset_index(drop=True)
         return indices
 
+    @_recorded("instruments")
     def instruments(self, group=None):
+        if self._instruments_outdated():
+            self._flights.do("instruments", self._refresh_instruments)
+        return self._select_group(group)
+
+    @_recorded("instruments")
+    async def ainstruments(self, group=None):
+        """Async version of instruments() using aclient"""
+        if self._instruments_outdated():
+            await self._flights.ado("instruments", self._arefresh_instruments)
+        return self._select_group(group)
+
+    def _instruments_outdated(self):
+        today = int(datetime.date.today().strftime("%Y%m%d"))
+        return self.instrumentList is None or today > self._instrumentsChecked
+
+    def _refresh_instruments(self):
+        lastDate = self._instruments_last_date()
+        if lastDate is not None:
+            self._update_instruments(self.client.Instrument(lastDate))
+
+    async def _arefresh_instruments(self):
+        lastDate = self._instruments_last_date()
+        if lastDate is not None:
+            self._update_instruments(await self.aclient.Instrument(lastDate))
+
+    def _instruments_last_date(self):
+        """Return date to request instruments from, None if list is fresh"""
+        if self.instrumentList is None and self._store is not None:
+            self._instrumentsChecked, instrumentList = (
+                self._store.load_instruments()
+            )
+            if self.compact and instrumentList is not None:
+                instrumentList = _compact_frame(
+                    instrumentList, settings._TSE_INS_CATEGORIES
+                )
+            self.instrumentList = instrumentList
         lastDate = (
             0
-            if self.instrumentList is None
-            else max(self.instrumentList.get("date", [0]))
+            if self.instrumentList is None or self.instrumentList.empty
+            else int(self.instrumentList["date"].max())
         )
         today = int(datetime.date.today().strftime("%Y%m%d"))
-        if self.instrumentList is None or today > lastDate:
-            # update instrument list
-            instrumentList = self._replace_arabic(self.client.Instrument(lastDate))
-            data = StringIO(instrumentList)
+        if self.instrumentList is None or today > self._instrumentsChecked:
+            return lastDate
+        return None
+
+    def _update_instruments(self, instrumentList):
+        with self.metrics.stage("instruments"):
+            self._parse_instruments(instrumentList)
+
+    def _parse_instruments(self, instrumentList):
+        instrumentList = self._replace_arabic(instrumentList).strip(";")
+        if instrumentList:
             instruments = pd.read_csv(
-                data,
+                StringIO(instrumentList),
                 lineterminator=";",
                 sep=",",
                 names=settings._TSE_INS_FIELD,
+                dtype={"group": str, "subgroup": str},
             )
             instruments['group'] = instruments['group'].str.strip()
-            # market = ID/NO  Index Market/Normal Market
-            # type = I/A  Indice/Normal
-            self.instrumentList = (
-                pd.concat([instruments, self.instrumentList])
-                .drop_duplicates(subset=["id"])
-                .sort_values(["symbol", "date"], ascending=[True, False])
-                .reset_index(drop=True)
+        else:
+            instruments = pd.DataFrame(columns=settings._TSE_INS_FIELD)
+        # market = ID/NO  Index Market/Normal Market
+        # type = I/A  Indice/Normal
+        instrumentList = self._merge_instruments(instruments)
+        if self.compact:
+            instrumentList = _compact_frame(
+                instrumentList, settings._TSE_INS_CATEGORIES
+            )
+        self.instrumentList = instrumentList
+        self._instrumentsChecked = int(datetime.date.today().strftime("%Y%m%d"))
+        if self._store is not None:
+            self._store.write_instruments(
+                self._instrumentsChecked, self.instrumentList
             )
+
+    def _merge_instruments(self, delta):
+        """
+        Merge delta of instruments into instrumentList
+
+        instrumentList is kept sorted by symbol and descending date. Rows
+        of known ids are updated at their position and new rows are
+        inserted at their sorted position, so the full list is never
+        re-sorted. A new frame is returned; instrumentList itself may be
+        held by callers and other threads and is never modified.
+        """
+        delta = delta.drop_duplicates(subset=["id"])
+        current = self.instrumentList
+        if current is None or current.empty:
+            return delta.sort_values(
+                ["symbol", "date"], ascending=[True, False]
+            ).reset_index(drop=True)
+        if delta.empty:
+            return current
+
+        positions = np.array(
+            [self._idIndex.get(i, -1) for i in delta["id"].tolist()], dtype=np.intp
+        )
+        known = positions >= 0
+        same = known.copy()
+        same[known] = (
+            (current["symbol"].to_numpy()[positions[known]]
+             == delta["symbol"].to_numpy()[known])
+            & (current["date"].to_numpy()[positions[known]]
+               == delta["date"].to_numpy()[known])
+        )
+        if same.any():
+            # sort key is unchanged, update rows at their position
+            rows = positions[same]
+            current = current.copy()
+            for column in settings._TSE_INS_FIELD:
+                values = current[column].to_numpy(copy=True)
+                values[rows] = delta[column].to_numpy()[same]
+                current[column] = values
+        moved = positions[known & ~same]
+        if len(moved):
+            current = current.drop(current.index[moved]).reset_index(drop=True)
+        new = delta[~same].sort_values(["symbol", "date"], ascending=[True, False])
+        if new.empty:
+            return current
+
+        symbols = current["symbol"].to_numpy()
+        dates = current["date"].to_numpy()
+        insert = []
+        for symbol, date in zip(new["symbol"], new["date"]):
+            lo = np.searchsorted(symbols, symbol, side="left")
+            hi = np.searchsorted(symbols, symbol, side="right")
+            # dates of a symbol are descending
+            insert.append(lo + np.searchsorted(-dates[lo:hi], -date, side="left"))
+        order = np.insert(
+            np.arange(len(current)), insert, len(current) + np.arange(len(new))
+        )
+        return (
+            pd.concat([current, new], ignore_index=True)
+            .take(order)
+            .reset_index(drop=True)
+        )
+
+    def _select_group(self, group):
         if group is None or self.instrumentList is None:
             ins = self.instrumentList
         else:
-            groups = self.groups()
-            group_code = None
-            if group in groups.values():
-                group_code = list(groups.keys())[list(groups.values()).index(group)]
-            ins = self.instrumentList[self.instrumentList.group == group_code]
+            self.groups()
+            group_code = self._groupCodes.get(group)
+            with self._lock:
+                ins = self._instrumentList.iloc[
+                    self._groupIndex.get(group_code, [])
+                ]
         return ins
 
     def to_csv(
@@ -154,63 +551,260 @@ class reader:
                     index=False
                 )
 
+    @_recorded("history")
     def history(
         self,
         symbols=None,
         start=None,
         end=None,
-        retry_count=3,
-        pause=0.1,
+        retry_count=None,
+        pause=None,
         adjust_price=False,
-        chunksize=50,
+        chunksize="auto",
         interval="d",
+        max_workers=None,
+        panel=False,
     ):
-        """read one data from specified URL"""
-        self.symbols = symbols
+        """
+        read one data from specified URL
 
-        # Ladder up the wait time between subsequent requests to improve
-        # probability of a successful retry
-        self.pause_multiplier = 2.5
-        self.chunksize = max(1, chunksize)
+        When panel is True one DataFrame indexed by date with
+        (field, symbol) columns is returned for all of symbols.
+        """
+        self._history_options(
+            symbols, start, end, retry_count, pause, adjust_price, chunksize,
+            interval, max_workers,
+        )
+
+        instruments = self.instruments()
+        if instruments is None:
+            return None
+
+        self._update_last_possible_deven()
+        with self._flights.hold(self._symbol_keys()):
+            requests = self._history_requests()
+            self._merge_chunks(
+                self._fetch_chunks(requests), _request_counts(requests)
+            )
+        if self._shares_outdated():
+            self.update_shares()
+        return self._history_result(panel)
+
+    @_isolated
+    @_recorded("history")
+    def history_iter(
+        self,
+        symbols=None,
+        start=None,
+        end=None,
+        retry_count=None,
+        pause=None,
+        adjust_price=False,
+        chunksize="auto",
+        interval="d",
+        max_workers=None,
+    ):
+        """
+        Generate (symbol, DataFrame) pairs of history as chunks arrive
+
+        Arguments are the same as history(). Symbols which are already up
+        to date are generated first. Others are fetched in batches of
+        whole symbols which fill chunks of all workers, and generated as
+        soon as their batch is merged. Nothing is fetched or held while a
+        pair is being consumed, so the loop may call the reader, even for
+        the same symbols.
+        """
+        self._history_options(
+            symbols, start, end, retry_count, pause, adjust_price, chunksize,
+            interval, max_workers,
+        )
+
+        instruments = self.instruments()
+        if instruments is None:
+            return
+
+        self._update_last_possible_deven()
+        if self._shares_outdated():
+            self.update_shares()
+        requests = self._history_requests()
+        stale = _request_counts(requests)
+        for symbol in dict.fromkeys(self._symbols_list()):
+            if symbol not in stale:
+                yield symbol, self._adjust(
+                    {symbol: self._history.get(symbol)}
+                )[symbol]
+        for batch in self._request_batches(requests):
+            self.symbols = batch
+            with self._flights.hold(self._symbol_keys()):
+                # requests are made again as another call may have
+                # fetched symbols of batch since they were planned
+                requests = self._history_requests()
+                self._merge_chunks(
+                    self._fetch_chunks(requests), _request_counts(requests)
+                )
+            for symbol in batch:
+                yield symbol, self._adjust(
+                    {symbol: self._history.get(symbol)}
+                )[symbol]
+
+    @_recorded("history")
+    async def ahistory(
+        self,
+        symbols=None,
+        start=None,
+        end=None,
+        retry_count=None,
+        pause=None,
+        adjust_price=False,
+        chunksize="auto",
+        interval="d",
+        max_in_flight=None,
+        panel=False,
+    ):
+        """
+        Async version of history() using aclient
+
+        All of chunks are requested on the running event loop and at most
+        max_in_flight requests of this call are sent at the same time,
+        within max_in_flight of the reader shared by all of calls.
+        """
+        self._history_options(
+            symbols, start, end, retry_count, pause, adjust_price, chunksize,
+            interval,
+        )
+        self._call_options().max_in_flight = max_in_flight
+
+        instruments = await self.ainstruments()
+        if instruments is None:
+            return None
+
+        if self._last_possible_deven_outdated():
+            await self._flights.ado(
+                "lastPossibleDeven", self._afetch_last_possible_deven
+            )
+
+        # requests of this call wait here, requests of all calls in aclient
+        inFlight = asyncio.Semaphore(
+            self._call_options().max_in_flight or self.aclient.limit
+        )
+
+        async def request(chunk):
+            async with inFlight:
+                started = time.perf_counter()
+                try:
+                    resp = await (
+                        self.aclient.DecompressAndGetInsturmentClosingPrice(
+                            chunk[1]
+                        )
+                    )
+                    _check_response(chunk[0], resp)
+                except Exception as e:
+                    return e
+            self._observe_chunk(resp, started)
+            return resp
+
+        async with self._flights.ahold(self._symbol_keys()):
+            requests = self._history_requests()
+            chunks = self._scheduler.plan(deque(requests), self.chunksize)
+            results = await asyncio.gather(
+                *(self._scheduler.afetch(chunk, request) for chunk, _ in chunks)
+            )
+            self._merge_chunks(
+                (pair for pairs in results for pair in pairs),
+                _request_counts(requests),
+            )
+        if self._shares_outdated():
+            await self.aupdate_shares()
+        return self._history_result(panel)
+
+    async def aclose(self):
+        """Close session of aclient"""
+        await self.aclient.close()
+
+    def _history_options(
+        self, symbols, start, end, retry_count, pause, adjust_price, chunksize,
+        interval, max_workers=None,
+    ):
+        # a new options object keeps options of concurrent calls apart
+        options = _CallOptions(self._defaultChunksize)
+        self._set_call_options(options)
+        self.symbols = symbols
+        # clients read retry_count and pause of the call from options
+        options.retry_count = retry_count
+        options.pause = pause
+        options.max_workers = max_workers
+        self.chunksize = _chunksize(chunksize)
 
         start, end = _sanitize_dates(start or settings.DEFAULT_START_DATE, end)
         self.start = start
         self.end = end
 
+        if adjust_price not in (False, True, "shares"):
+            raise ValueError(
+                "Invalid adjust_price: valid values are False, True and 'shares'."
+            )
         self.adjust_price = adjust_price
         self.interval = interval
 
-        if self.interval not in ["d", "w", "m"]:
-            raise ValueError("Invalid interval: valid values are 'd', 'w' and 'm'.")
-
-        instruments = self.instruments()
-        if instruments is None:
-            return None
+        if self.interval not in INTERVALS:
+            raise ValueError(
+                "Invalid interval: valid values are 'd', 'w', 'm', 'jw', 'jm' "
+                "and 'jy'."
+            )
 
+    def _symbols_list(self):
         if type(self.symbols) is str:
-            symbols_list = [self.symbols]
-        else:
-            symbols_list = self.symbols
+            return [self.symbols]
+        return self.symbols
 
-        today = int(datetime.date.today().strftime("%Y%m%d"))
-        if self.lastPossibleDeven is None or today > max(
-            map(int, self.lastPossibleDeven.split(";"))
-        ):
-            self.lastPossibleDeven = self.client.LastPossibleDeven()
+    def _max_workers(self):
+        """Return max_workers of the current call"""
+        workers = self._call_options().max_workers
+        return self.max_workers if workers is None else workers
+
+    def _symbol_keys(self):
+        return [("symbol", symbol) for symbol in self._symbols_list()]
+
+    def _update_last_possible_deven(self):
+        """Fetch last possible deven once for concurrent calls if outdated"""
+        if self._last_possible_deven_outdated():
+            self._flights.do(
+                "lastPossibleDeven", self._fetch_last_possible_deven
+            )
+
+    def _fetch_last_possible_deven(self):
+        self.lastPossibleDeven = self.client.LastPossibleDeven()
+
+    async def _afetch_last_possible_deven(self):
+        self.lastPossibleDeven = await self.aclient.LastPossibleDeven()
+
+    def _last_possible_deven_outdated(self):
+        return self._calendar.outdated()
+
+    def _history_requests(self):
+        """
+        Return list of (symbol, insCode request, expected rows) to update
+
+        Expected rows are trading days after the last record of symbol up
+        to the last possible deven of its market. Symbols already fetched
+        against the current last possible deven are skipped, even if they
+        have no record up to it.
+        """
         lastDate = self.lastPossibleDeven.split(";")
         if len(lastDate) < 2:
             raise IOError("Last possible date request returned no data")
         normalLastPossibleDeven = int(lastDate[0])
         indexLastPossibleDeven = int(lastDate[1])
 
-        insCodes = []
-        insSymbols = []
-        insCodesList = []
-        for symbol in symbols_list:
+        self._load_stored(self._symbols_list())
+        requests = []
+        for symbol in self._symbols_list():
             deven = 0
-            ins = instruments[instruments.symbol == symbol]
+            ins = self._instrument_rows(symbol)
             if len(ins) == 0:
                 continue
+            if symbol in self._history and self._calendar.is_updated(symbol):
+                continue
             if (
                 symbol in self._history
                 and self._history.get(symbol) is not None
@@ -223,86 +817,587 @@ class reader:
                ((ins.market == "ID").any() and
                deven < indexLastPossibleDeven)):
                 # update history
-                insCodes += list(ins["id"])
-                insSymbols += list(ins["symbol"])
-                insCodesList += list(
-                    ins.apply(
-                        lambda x: f"{x.id},{deven},"
-                        + ("1" if x.market == "ID" else "0"),
-                        axis=1,
+                requests += [
+                    (
+                        symbol,
+                        f"{insId},{deven}," + ("1" if market == "ID" else "0"),
+                        self._calendar.trading_days(
+                            deven,
+                            indexLastPossibleDeven if market == "ID"
+                            else normalLastPossibleDeven,
+                        ),
                     )
-                )
+                    for insId, market in zip(ins["id"], ins["market"])
+                ]
+        return requests
 
-        chunk = 0
-        while chunk < len(insCodesList):
-            resp = self.client.DecompressAndGetInsturmentClosingPrice(
-                ";".join(insCodesList[chunk : chunk + self.chunksize])
+    def _request_batches(self, requests):
+        """
+        Generate lists of symbols of requests to be fetched together
+
+        A batch takes whole symbols while they fit chunks of all workers,
+        by expected rows with 'auto' chunksize and by requests otherwise,
+        and by max_symbols requests of scheduler per chunk. The limit is
+        read for each batch, so it follows the scheduler.
+        """
+        sizes = {}
+        counts = _request_counts(requests)
+        for symbol, _, rows in requests:
+            size = max(rows, 1) if self.chunksize == "auto" else 1
+            sizes[symbol] = sizes.get(symbol, 0) + size
+        batch, total, count = [], 0, 0
+        for symbol, size in sizes.items():
+            workers = max(1, self._max_workers() or 1)
+            limit = workers * (
+                self._scheduler.target_rows if self.chunksize == "auto"
+                else self.chunksize
             )
-            historyStr = resp.split("@")
-            for i, v in enumerate(historyStr):
-                data = StringIO(v)
-                ohlc = pd.read_csv(
-                    data, lineterminator=";", sep=",", names=settings._TSE_FIELD
-                )
-                ohlc = ohlc[ohlc["Count"] != 0].reset_index(drop=True)[
-                    settings._TSE_FIELD_ORDER
+            if batch and (
+                total + size > limit
+                or count + counts[symbol] > workers * self._scheduler.max_symbols
+            ):
+                yield batch
+                batch, total, count = [], 0, 0
+            batch.append(symbol)
+            total += size
+            count += counts[symbol]
+        if batch:
+            yield batch
+
+    def _merge_chunks(self, responses, unmerged):
+        """
+        Parse ((symbols, insCodes), response) pairs into history
+
+        A response can be an exception of failed chunk; symbols of such
+        chunks are reported with a SymbolWarning. Records are matched to
+        symbols by instrument id.
+
+        unmerged is a Counter of requests of each symbol, decremented as
+        their chunks are merged. History of a symbol is stored once all
+        of its requests are merged: the store only appends rows after its
+        last Date, so storing the chunk of a newer instrument id first
+        would lose rows of an older one, and a symbol with a failed chunk
+        is not stored at all.
+        """
+        failed = []
+        for chunkSymbols, insCodes, parsed in self._parse_chunks(
+            responses, failed
+        ):
+            self.metrics.count(
+                "rows", sum(len(c["Date"]) for c in parsed.values())
+            )
+            with self.metrics.stage("merge"):
+                for symbol, insCode in zip(chunkSymbols, insCodes):
+                    self._merge_history(symbol, _to_frame(parsed[insCode]))
+                    if self._is_index(symbol):
+                        self._calendar.add_dates(parsed[insCode]["Date"])
+                unmerged.subtract(chunkSymbols)
+                # store each symbol as soon as all of its chunks are merged
+                merged = [
+                    symbol for symbol in dict.fromkeys(chunkSymbols)
+                    if unmerged[symbol] == 0
                 ]
-                if insSymbols[chunk + i] in self._history:
-                    self._history[insSymbols[chunk + i]] = (
-                        pd.concat(
-                            [self._history[insSymbols[chunk + i]], ohlc],
-                            ignore_index=True, sort=False
-                        )
-                        .sort_values("Date")
-                        .reset_index(drop=True)
-                    )
-                else:
-                    self._history[insSymbols[chunk + i]] = ohlc
-            chunk += self.chunksize
+                if self._store is not None:
+                    for symbol in merged:
+                        self._store.append(symbol, self._history[symbol])
+                self._calendar.mark_updated(merged)
+        if failed:
+            warnings.warn(
+                f"Failed to fetch history of {', '.join(failed)}", SymbolWarning
+            )
+
+    def _parse_chunks(self, responses, failed):
+        """
+        Yield (symbols, insCodes, parsed) of fetched chunks
+
+        Symbols of failed chunks are added to failed. With worker
+        processes, responses are parsed in the pool while later chunks
+        are still being fetched.
+        """
+        pool = self._process_pool()
+        pending = []
+        for (chunkSymbols, chunkCodes), resp in responses:
+            if isinstance(resp, Exception):
+                failed += chunkSymbols
+                continue
+            insCodes = [int(c.split(",")[0]) for c in chunkCodes.split(";")]
+            if pool is not None:
+                pending.append((
+                    chunkSymbols,
+                    insCodes,
+                    pool.submit(_parse_closing_prices, resp, insCodes),
+                ))
+                continue
+            with self.metrics.stage("parse"):
+                parsed = _parse_closing_prices(resp, insCodes)
+            yield chunkSymbols, insCodes, parsed
+        for chunkSymbols, insCodes, future in pending:
+            with self.metrics.stage("parse"):
+                parsed = future.result()
+            yield chunkSymbols, insCodes, parsed
+
+    def _process_pool(self):
+        """Return pool of worker processes, None if processes is not set"""
+        if not self.processes:
+            return None
+        with self._lock:
+            if self._pool is None:
+                # fork would copy locks held by fetch threads into workers
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
 
+    def close(self):
+        """Stop worker processes"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _load_stored(self, symbols):
+        """Load stored history of symbols which are not in memory"""
+        if self._store is None:
+            return
+        for symbol in symbols:
+            if symbol not in self._history and symbol in self._store:
+                data = self._store.load(symbol)
+                self._history[symbol] = _compact_frame(data) if self.compact else data
+                if data is not None and self._is_index(symbol):
+                    self._calendar.add_dates(data["Date"])
+
+    def _history_result(self, panel=False):
+        with self.metrics.stage("adjust"):
+            return self._build_result(panel)
+
+    def _build_result(self, panel):
+        if panel:
+            return self._panel(self._symbols_list())
         if type(self.symbols) is str:
             return self._adjust({self.symbols: self._history.get(self.symbols, None)})[
                 self.symbols
             ]
         else:
-            return self._adjust({s: self._history.get(s, None) for s in symbols_list})
+            return self._adjust(
+                {s: self._history.get(s, None) for s in self._symbols_list()}
+            )
 
-    def _adjust(self, idf):
+    def _panel(self, symbols):
+        """
+        Return date aligned history of symbols as one DataFrame
+
+        Columns of stored histories are concatenated and scattered into a
+        2-D array per field, with a row per date and a column per symbol.
+        Missing records are NaN.
+        """
+        fields = [f for f in settings._TSE_FIELD_ORDER if f != "Date"]
+        symbols = list(dict.fromkeys(symbols))
+        histories = [
+            (j, self._history.get(s)) for j, s in enumerate(symbols)
+            if self._history.get(s) is not None and len(self._history.get(s)) > 0
+        ]
+        columns = pd.MultiIndex.from_product([fields, symbols])
+        if not histories:
+            return pd.DataFrame(
+                index=pd.DatetimeIndex([], name="Date"), columns=columns
+            )
+
+        lengths = [len(h) for _, h in histories]
+        symbolIdx = np.repeat([j for j, _ in histories], lengths)
+        dates = np.concatenate([h["Date"].to_numpy() for _, h in histories])
+        values = {
+            f: np.concatenate(
+                [h[f].to_numpy(dtype=np.float64) for _, h in histories]
+            )
+            for f in fields
+        }
+        if self.adjust_price == "shares":
+            factor = np.concatenate([
+                self._shares.factor(
+                    self._instrument_rows(symbols[j])["id"].tolist(),
+                    h["Date"].to_numpy(),
+                )
+                for j, h in histories
+            ])
+            adjusted = factor != 1
+        elif self.adjust_price:
+            first = np.zeros(len(dates), dtype=bool)
+            first[np.concatenate(([0], np.cumsum(lengths)[:-1]))] = True
+            factor, adjusted = _adjustment_factors(
+                values["AdjClose"], values["Yesterday"], first
+            )
+        if self.adjust_price:
+            stock = np.array([
+                self._instrument_rows(symbols[j]).market.eq("NO").head(1).any()
+                for j, _ in histories
+            ])
+            adjusted &= np.repeat(stock, lengths)
+            for f in ["Open", "High", "Low", "Close", "AdjClose", "Yesterday"]:
+                values[f][adjusted] = np.round(values[f][adjusted] * factor[adjusted])
+
+        days = pd.to_datetime(dates.astype(str), format="%Y%m%d").to_numpy()
+        keep = (days >= self.start.to_datetime64()) & (days <= self.end.to_datetime64())
+        days, symbolIdx = days[keep], symbolIdx[keep]
+        values = {f: v[keep] for f, v in values.items()}
+        if self.interval != "d":
+            days, symbolIdx, values = _resample_arrays(
+                days, symbolIdx, values, self.interval
+            )
+
+        uniqueDates, dateIdx = np.unique(days, return_inverse=True)
+        index = pd.DatetimeIndex(
+            uniqueDates.astype("datetime64[ns]"), name="Date"
+        )
+        data = np.full((len(uniqueDates), len(fields) * len(symbols)), np.nan)
+        for k, f in enumerate(fields):
+            data[dateIdx, k * len(symbols) + symbolIdx] = values[f]
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    @_recorded("sync")
+    def sync(
+        self,
+        symbols=None,
+        chunksize="auto",
+        max_workers=None,
+        checkpoint=None,
+        progress=None,
+    ):
+        """
+        Fetch and store histories without building adjusted views
+
+        Parameters
+        ----------
+        symbols : list of str, default None
+            Symbols to update, default is all of instruments.
+        chunksize : int or 'auto', default 'auto'
+        max_workers : int, default None
+        checkpoint : str or Path, default None
+            JSON file of last Date of symbols updated for the current last
+            possible deven. It is written after each chunk, and symbols
+            found in it are skipped, so an interrupted sync resumes where
+            it stopped. Requires a reader with store, as skipped symbols
+            are only kept there.
+        progress : callable, default None
+            Called as progress(done, total, symbols) after each chunk,
+            done and total are numbers of instruments.
+
+        Returns
+        -------
+        dict
+            {symbol: last Date} of updated symbols.
+        """
+        if checkpoint is not None and self._store is None:
+            raise ValueError("checkpoint of sync requires a reader with store.")
         instruments = self.instruments()
+        if symbols is None:
+            symbols = list(dict.fromkeys(instruments["symbol"].tolist()))
+        self._history_options(
+            symbols, None, None, None, None, False, chunksize, "d", max_workers
+        )
+        self._update_last_possible_deven()
+
+        state = {}
+        if checkpoint is not None and Path(checkpoint).exists():
+            with open(checkpoint, encoding="utf-8") as f:
+                state = json.load(f)
+        if state.get("lastPossibleDeven") != self.lastPossibleDeven:
+            state = {"lastPossibleDeven": self.lastPossibleDeven, "symbols": {}}
+        done = state["symbols"]
+
+        def lastDate(symbol):
+            data = self._history.get(symbol)
+            return 0 if data is None or data.empty else int(data["Date"].iloc[-1])
+
+        def save():
+            if checkpoint is not None:
+                tmp = f"{checkpoint}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp, checkpoint)
+
+        self.symbols = [s for s in dict.fromkeys(symbols) if s not in done]
+        planned = self._history_requests()
+        stale = _request_counts(planned)
+        for symbol in self.symbols:
+            if symbol not in stale:
+                done[symbol] = lastDate(symbol)
+        save()
+        fetched = 0
+        # keys are held per batch, like history_iter(), so other calls
+        # wait for symbols of one batch instead of all of them
+        for batch in self._request_batches(planned):
+            self.symbols = batch
+            with self._flights.hold(self._symbol_keys()):
+                requests = self._history_requests()
+                remaining = _request_counts(requests)
+                unmerged = _request_counts(requests)
+                failed = set()
+                for symbol in batch:
+                    if symbol not in remaining:
+                        done[symbol] = lastDate(symbol)
+                save()
+                for chunk, resp in self._fetch_chunks(requests):
+                    self._merge_chunks([(chunk, resp)], unmerged)
+                    remaining.subtract(chunk[0])
+                    if isinstance(resp, Exception):
+                        failed.update(chunk[0])
+                    else:
+                        for symbol in dict.fromkeys(chunk[0]):
+                            if remaining[symbol] == 0 and symbol not in failed:
+                                done[symbol] = lastDate(symbol)
+                        save()
+                    fetched += len(chunk[0])
+                    if progress is not None:
+                        progress(fetched, len(planned), chunk[0])
+        return done
+
+    def _fetch_chunks(self, requests):
+        """
+        Fetch closing prices of requests, concurrently if max_workers > 1
+
+        Requests of _history_requests() are split into chunks by the
+        scheduler when a worker is free, so chunks are sized by latency
+        and size of chunks fetched before them. Yields (chunk, response)
+        pairs in the order chunks are taken, so merge order does not
+        depend on which request finishes first. A failed or truncated
+        chunk is bisected by the scheduler and its halves fetched again;
+        when a single instrument, or both halves of a chunk, fail the
+        exception is yielded in place of the response so the remaining
+        chunks are still merged.
+        """
+
+        def request(chunk):
+            started = time.perf_counter()
+            try:
+                resp = self.client.DecompressAndGetInsturmentClosingPrice(chunk[1])
+                _check_response(chunk[0], resp)
+            except Exception as e:
+                return e
+            self._observe_chunk(resp, started)
+            return resp
+
+        def fetch(chunk):
+            return self._scheduler.fetch(chunk, request)
+
+        pending = deque(requests)
+        workers = self._max_workers()
+        if not workers or workers <= 1:
+            while pending:
+                yield from fetch(self._scheduler.take(pending, self.chunksize)[0])
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # futures in order of submission; finished ones wait at most
+            # for a few slower chunks ahead of them
+            submitted = deque()
+            running = set()
+            while pending or submitted:
+                while (
+                    pending and len(running) < workers
+                    and len(submitted) < 4 * workers
+                ):
+                    # run each fetch in a copy of context to keep the
+                    # metrics record
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        fetch,
+                        self._scheduler.take(pending, self.chunksize)[0],
+                    )
+                    submitted.append(future)
+                    running.add(future)
+                if not submitted[0].done():
+                    _, running = wait(running, return_when=FIRST_COMPLETED)
+                else:
+                    running = {f for f in running if not f.done()}
+                while submitted and submitted[0].done():
+                    yield from submitted.popleft().result()
+
+    def _observe_chunk(self, resp, started):
+        """Report rows, latency and size of a fetched chunk to scheduler"""
+        rows = resp.count(";") + sum(1 for part in resp.split("@") if part)
+        self._scheduler.observe(rows, time.perf_counter() - started, len(resp))
+
+    def _merge_history(self, symbol, ohlc):
+        if symbol in self._history:
+            # nothing new, e.g. a halted symbol, keeps history and its views
+            if ohlc.empty:
+                return
+            ohlc = (
+                pd.concat(
+                    [self._history[symbol], ohlc],
+                    ignore_index=True, sort=False
+                )
+                .sort_values("Date")
+                .reset_index(drop=True)
+            )
+        if self.compact:
+            ohlc = _compact_frame(ohlc)
+        self._history[symbol] = ohlc
+        self._views.invalidate(symbol)
+
+    def memory_usage(self):
+        """
+        Return memory usage of histories in bytes
+
+        Returns
+        -------
+        pd.Series
+            Bytes used by history of each symbol, and by the instrument
+            list under 'instrumentList' key.
+        """
+        usage = {
+            symbol: int(data.memory_usage(index=True, deep=True).sum())
+            for symbol, data in self._history.resident().items()
+            if data is not None
+        }
+        if self.instrumentList is not None:
+            usage["instrumentList"] = int(
+                self.instrumentList.memory_usage(index=True, deep=True).sum()
+            )
+        return pd.Series(usage, dtype=np.int64)
+
+    def _adjust(self, idf):
+        self.instruments()
         df = idf
         if type(idf) is pd.DataFrame:
             df = {0: idf}
 
+        views = {}
+        keys = {}
+        missing = {}
         for i in df:
-            if df[i] is None:
+            if df[i] is None or type(idf) is pd.DataFrame:
+                missing[i] = df[i]
                 continue
-            ins = instruments[instruments.symbol == i]
-            df[i] = df[i].copy()
-            if self.adjust_price and not ins.empty and ins.iloc[0].market == "NO":
-                df[i] = self._adjust_price(df[i])
-
-            if "Date" in df[i]:
-                df[i]["Date"] = pd.to_datetime(df[i]["Date"], format="%Y%m%d")
-                df[i] = df[i].set_index("Date")
-                df[i] = df[i][self.start : self.end]
-                if self.interval == "w":
-                    ohlc = df[i]["Close"].resample("w-sat").ohlc()
-                    ohlc["Volumne"] = df[i]["Volume"].resample("w-sat").sum()
-                    ohlc["Count"] = df[i]["Count"].resample("w-sat").sum()
-                    ohlc["Value"] = df[i]["Value"].resample("w-sat").sum()
-                    df[i] = ohlc
-                elif self.interval == "m":
-                    ohlc = df[i]["Close"].resample("m").ohlc()
-                    ohlc["Volume"] = df[i]["Volume"].resample("m").sum()
-                    ohlc["Count"] = df[i]["Count"].resample("m").sum()
-                    ohlc["Value"] = df[i]["Value"].resample("m").sum()
-                    df[i] = ohlc
+            keys[i] = self._view_key(i, df[i])
+            views[i] = None
+            if self.interval != "d":
+                views[i] = self._views.get(keys[i] + (self.start, self.end))
+            if views[i] is None:
+                missing[i] = df[i]
+
+        derived = {}
+        if self.processes:
+            pooled = {
+                i: data for i, data in missing.items()
+                if data is not None and not data.empty and not (
+                    i in keys
+                    and self._views.get(self._daily_key(keys[i])) is not None
+                )
+            }
+            if len(pooled) > 1:
+                derived = self._derive_views(pooled, keys)
+        daily = self._daily_views(
+            {i: missing[i] for i in missing if i not in derived}, keys
+        )
+        for i in daily:
+            if daily[i] is not None:
+                daily[i] = daily[i][self.start : self.end]
+        derived.update(_resample_frames(daily, self.interval))
+        for i in derived:
+            views[i] = derived[i]
+            if i in keys and self.interval != "d":
+                self._views.put(keys[i] + (self.start, self.end), derived[i])
+
+        for i in df:
+            df[i] = None if views[i] is None else views[i].copy()
 
         if type(idf) is pd.DataFrame:
             return df[0]
         else:
             return df
 
+    def _derive_views(self, histories, keys):
+        """
+        Adjust, slice and resample histories in worker processes
+
+        Histories are split into batches of about equal rows, two per
+        process. Daily views are memoized like _daily_views().
+        """
+        adjust, factors = {}, {}
+        for i, data in histories.items():
+            adjust[i] = self.adjust_price if self._is_stock(i) else False
+            if adjust[i] == "shares":
+                factors[i] = self._share_factor(i, data)
+        pool = self._process_pool()
+        futures = [
+            pool.submit(
+                _derive_views,
+                batch,
+                {i: adjust[i] for i in batch},
+                {i: factors[i] for i in batch if i in factors},
+                self.start,
+                self.end,
+                self.interval,
+            )
+            for batch in _batches(histories, 2 * self.processes)
+        ]
+        views = {}
+        for future in futures:
+            views.update(future.result())
+        if self.interval == "d":
+            for i in views:
+                if i in keys:
+                    self._views.put(self._daily_key(keys[i]), views[i])
+                views[i] = views[i][self.start : self.end]
+        return views
+
+    @staticmethod
+    def _daily_key(key):
+        """Return key of daily view of a (symbol, adjust, interval, last Date) key"""
+        return key[:2] + ("d", key[3])
+
+    def _view_key(self, symbol, data):
+        """Return (symbol, adjust_price, interval, last Date) of a view"""
+        adjust = self.adjust_price if self._is_stock(symbol) else False
+        lastDate = int(data["Date"].iloc[-1]) if len(data) else 0
+        return (symbol, adjust, self.interval, lastDate)
+
+    def _is_stock(self, symbol):
+        ins = self._instrument_rows(symbol)
+        return not ins.empty and ins.iloc[0].market == "NO"
+
+    def _is_index(self, symbol):
+        ins = self._instrument_rows(symbol)
+        return not ins.empty and ins.iloc[0].market == "ID"
+
+    def _daily_views(self, df, keys):
+        """
+        Return adjusted histories of df indexed by date
+
+        Views of symbols in keys are memoized by symbol, adjust_price and
+        last Date.
+        """
+        views = {}
+        missing = {}
+        for i in df:
+            if i in keys:
+                views[i] = self._views.get(self._daily_key(keys[i]))
+            if views.get(i) is None:
+                missing[i] = df[i]
+
+        if self.adjust_price:
+            stocks = {}
+            for i in missing:
+                if missing[i] is not None and self._is_stock(i):
+                    stocks[i] = missing[i]
+            if self.adjust_price == "shares":
+                missing.update(self._adjust_by_shares(stocks))
+            else:
+                missing.update(self._adjust_prices(stocks))
+
+        for i in missing:
+            data = missing[i]
+            if data is not None:
+                data = data.copy()
+                if "Date" in data:
+                    data["Date"] = pd.to_datetime(data["Date"], format="%Y%m%d")
+                    data = data.set_index("Date")
+                if i in keys:
+                    self._views.put(self._daily_key(keys[i]), data)
+            views[i] = data
+        return views
+
     def _adjust_price(self, hist_data, columns=None):
         """
         Return modifed DataFrame with adjusted prices based on
@@ -358,34 +1453,107 @@ class reader:
             raise TypeError(
                 "Error in adjusting price; index type must be RangeIndex"
             ) from None
-        if columns is None:
-            columns = ["Open", "High", "Low", "Close", "AdjClose", "Yesterday"]
-
-        data = hist_data.copy()
-        step = data.index.step
-        diff = list(data.index[data.shift(1).AdjClose != data.Yesterday])
-        if len(diff) > 0:
-            diff.pop(0)
-        ratio = 1
-        ratio_list = []
-        for i in diff[::-1]:
-            ratio *= data.loc[i, "Yesterday"] / data.shift(1).loc[i, "AdjClose"]
-            ratio_list.insert(0, ratio)
-        for i, k in enumerate(diff):
-            if i == 0:
-                start = data.index.start
-            else:
-                start = diff[i - 1]
-            end = diff[i] - step
-            data.loc[start:end, columns] = round(
-                data.loc[start:end, columns] * ratio_list[i]
-            )
+        return self._adjust_prices({0: hist_data}, columns)[0]
+
+    def _adjust_prices(self, histories, columns=None):
+        """Adjust historical records of many stocks, see _adjust_histories"""
+        return _adjust_histories(histories, columns)
+
+    def _adjust_by_shares(self, histories, columns=None):
+        """
+        Adjust historical records of stocks by the share change ledger
+
+        Factors are precomputed per instrument from the ledger, so each
+        history is adjusted with a single multiply.
+        """
+        result = {}
+        for k, data in histories.items():
+            if data is None or data.empty:
+                result[k] = data
+                continue
+            factor = self._share_factor(k, data)
+            result[k] = _apply_factor(data, factor, factor != 1, columns)
+        return result
+
+    def _share_factor(self, symbol, data):
+        return self._shares.factor(
+            self._instrument_rows(symbol)["id"].tolist(), data["Date"].to_numpy()
+        )
+
+    def update_shares(self):
+        """
+        Fetch share changes after the last ledger id
+
+        Returns number of new share changes.
+        """
+        return self._flights.do("shares", self._fetch_shares)
+
+    async def aupdate_shares(self):
+        """Async version of update_shares() using aclient"""
+        return await self._flights.ado("shares", self._afetch_shares)
+
+    def _fetch_shares(self):
+        data = self.client.InstrumentAndShare(
+            self._shares_last_date(), self._shares.last_id
+        )
+        return self._add_shares(data)
+
+    async def _afetch_shares(self):
+        data = await self.aclient.InstrumentAndShare(
+            self._shares_last_date(), self._shares.last_id
+        )
+        return self._add_shares(data)
+
+    def _add_shares(self, data):
+        with self.metrics.stage("shares"):
+            count = self._shares.update(data)
+        self._shares_updated(count)
+        return count
+
+    def _shares_last_date(self):
+        if self.instrumentList is None or self.instrumentList.empty:
+            return 0
+        return int(self.instrumentList["date"].max())
 
-        return data
+    def _shares_updated(self, count):
+        self._sharesChecked = int(datetime.date.today().strftime("%Y%m%d"))
+        if count:
+            # adjusted views depend on the ledger
+            self._views.clear()
+
+    def _shares_outdated(self):
+        today = int(datetime.date.today().strftime("%Y%m%d"))
+        return self.adjust_price == "shares" and today > self._sharesChecked
+
+    def share_factors(self, symbol):
+        """
+        Return price adjustment factors of symbol from share changes
+
+        Returns
+        -------
+        pd.Series
+            Factor of prices before each date of share change.
+        """
+        self.instruments()
+        if self._sharesChecked == 0:
+            self.update_shares()
+        dates, factors = [], []
+        for insId in self._instrument_rows(symbol)["id"].tolist():
+            eventDates, cumulative = self._shares.factors(insId)
+            dates += list(eventDates)
+            factors += list(cumulative[:-1])
+        return pd.Series(
+            factors,
+            index=pd.DatetimeIndex(
+                pd.to_datetime([str(d) for d in dates], format="%Y%m%d"),
+                name="Date",
+            ),
+            dtype=np.float64,
+        ).sort_index()
 
     def group_name(self, symbol):
-        instruments = self.instruments()
-        ins = instruments[instruments.symbol == symbol]
+        self.instruments()
+        ins = self._instrument_rows(symbol)
         group_name = None
         if len(ins) > 0:
             group_code = ins.iloc[0].get("group")
@@ -395,10 +1563,14 @@ class reader:
     def groups(self):
         if not self._groups:
             self._groups = self._fetch_groups()
+            # first code of a repeated name is used like a list index
+            self._groupCodes = {}
+            for code, name in self._groups.items():
+                self._groupCodes.setdefault(name, code)
         return self._groups
 
     def _fetch_groups(self):
-        resp = requests.get(settings._TSE_URL_GROUP_LIST)
+        resp = self.client._request("GET", settings._TSE_URL_GROUP_LIST)
         groups = {}
         if resp.status_code == 200:
             group_list = self._replace_arabic(resp.text)
@@ -419,4 +1591,4 @@ class reader:
         return groups
 
     def _replace_arabic(self, string: str):
-        return string.replace("ك", "ک").replace("ي", "ی")
+        return _replace_arabic(string)
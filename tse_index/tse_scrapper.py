@@ -1,12 +1,200 @@
 import zlib
 import struct
 import base64
+import time
+import asyncio
+import xml.etree.ElementTree as ET
 import requests
-import bs4
+
+from tse_index._metrics import Metrics
+from tse_index._utils import RemoteDataError, _init_session
+
+
+def _aiohttp():
+    """Import aiohttp on first use of AsyncTSEClient, it is slow to import"""
+    try:
+        import aiohttp
+    except ImportError:  # pragma: no cover
+        raise ImportError("aiohttp is required for AsyncTSEClient") from None
+    return aiohttp
+
+
+def _soap_headers(action, headers=None):
+    allHeaders = {
+        "User-Agent": "Mozilla/4.0 (compatible; MSIE 6.0; MS Web Services Client Protocol 2.0.50727.9151)",
+        "Content-Type": "text/xml; charset=utf-8",
+        "SOAPAction": f'"http://tsetmc.com/{action}"',
+    }
+    allHeaders.update(headers or {})
+    return allHeaders
+
+
+class _SoapResult:
+    """
+    Incremental extractor of <action>Result text from SOAP response
+
+    Response bytes are fed as they arrive and parsed by a pull parser;
+    elements other than the result are dropped as soon as they end, so no
+    document tree is kept in memory.
+    """
+
+    _READ_SIZE = 64 * 1024
+
+    def __init__(self, action):
+        self.tag = f"{action}Result"
+        self.parser = ET.XMLPullParser(events=("end",))
+        self.text = None
+        self.size = 0
+
+    def feed(self, data):
+        """Feed bytes of response, return True when result is found"""
+        self.size += len(data)
+        if self.text is None:
+            self.parser.feed(data)
+            for _, elem in self.parser.read_events():
+                if elem.tag.rpartition("}")[2] == self.tag:
+                    self.text = elem.text or ""
+                    break
+                elem.clear()
+        return self.text is not None
+
+    def result(self):
+        return self.text or ""
+
+    @classmethod
+    def read(cls, response, action, metrics=None):
+        """Extract result from a streamed requests response"""
+        extractor = cls(action)
+        try:
+            for data in response.iter_content(chunk_size=cls._READ_SIZE):
+                if extractor.feed(data):
+                    break
+        finally:
+            response.close()
+            if metrics is not None:
+                metrics.count("response_bytes", extractor.size, action=action)
+        return extractor.result()
+
+    @classmethod
+    async def aread(cls, response, action, metrics=None):
+        """Extract result from an aiohttp response"""
+        extractor = cls(action)
+        try:
+            async for data in response.content.iter_chunked(cls._READ_SIZE):
+                if extractor.feed(data):
+                    break
+        finally:
+            if metrics is not None:
+                metrics.count("response_bytes", extractor.size, action=action)
+        return extractor.result()
 
 
 class TSEClient:
-    def DecompressAndGetInsturmentClosingPrice(insCodesList: str):
+    """
+    Client of tsetmc.com SOAP web service
+
+    Requests are sent over a pooled keep-alive session and retried with
+    a laddered pause when they fail.
+
+    Parameters
+    ----------
+    retry_count : int, default 3
+        Number of times to retry query request.
+    pause : float, default 0.1
+        Time, in seconds, of the pause between retries.
+    session : Session, default None
+        requests.sessions.Session instance to be used.
+    pause_multiplier : float, default 2.5
+        Factor of pause increase after each failed try.
+    pool_maxsize : int, default 10
+        Number of connections kept alive in the pool of a new session.
+    metrics : Metrics, default None
+        Collector of request timings, byte counts and retries.
+    options : callable, default None
+        Returns options of the current call whose retry_count and pause,
+        when not None, override those of the client for that call only.
+    """
+
+    url = "http://service.tsetmc.com/WebService/TseClient.asmx"
+
+    def __init__(
+        self, retry_count=3, pause=0.1, session=None, pause_multiplier=2.5,
+        pool_maxsize=10, metrics=None, options=None,
+    ):
+        if session is None:
+            session = _init_session(None)
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=max(1, pool_maxsize)
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = _init_session(session)
+        self.retry_count = retry_count
+        self.pause = pause
+        self.pause_multiplier = pause_multiplier
+        self.metrics = Metrics() if metrics is None else metrics
+        self.options = options
+
+    def _retry_settings(self):
+        """Return (retry_count, pause) of the current call"""
+        options = None if self.options is None else self.options()
+        retry_count = getattr(options, "retry_count", None)
+        pause = getattr(options, "pause", None)
+        return (
+            self.retry_count if retry_count is None else retry_count,
+            self.pause if pause is None else pause,
+        )
+
+    def _request(self, method, url, read=None, **kwargs):
+        """
+        Send request and retry with laddered pause until it succeeds
+
+        When read is given the response is streamed and read(response) is
+        returned, so errors while reading the body are retried too.
+        Raises RemoteDataError when all of retries are failed.
+        """
+        retry_count, pause = self._retry_settings()
+        last_error = ""
+        for attempt in range(max(0, retry_count) + 1):
+            self._count_request(attempt, kwargs.get("data"))
+            try:
+                response = self.session.request(
+                    method, url, stream=read is not None, **kwargs
+                )
+                if response.status_code == requests.codes.ok:
+                    return response if read is None else read(response)
+                last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+            except (requests.exceptions.RequestException, ET.ParseError) as e:
+                last_error = str(e)
+            time.sleep(pause)
+            # Increase time between subsequent requests
+            pause *= self.pause_multiplier
+        msg = f"Unable to read URL: {url}"
+        if last_error:
+            msg += f"\nResponse Text:\n{last_error}"
+        raise RemoteDataError(msg)
+
+    def _count_request(self, attempt, data):
+        self.metrics.count("requests")
+        if attempt:
+            self.metrics.count("retries")
+        if data:
+            self.metrics.count("request_bytes", len(data))
+
+    def _soap(self, action, body, headers=None):
+        """Post SOAP body and return text of <action>Result tag"""
+        with self.metrics.stage("request", action=action):
+            return self._request(
+                "POST",
+                self.url,
+                read=lambda response: _SoapResult.read(
+                    response, action, self.metrics
+                ),
+                data=body,
+                headers=_soap_headers(action, headers),
+            )
+
+    def DecompressAndGetInsturmentClosingPrice(self, insCodesList: str):
         """
         Fetch historical price of stocks and indices
 
@@ -39,7 +227,10 @@ class TSEClient:
         """
         if not insCodesList:
             return ""
+        return self._soap(*self._closing_price_request(insCodesList))
 
+    @staticmethod
+    def _closing_price_request(insCodesList):
         compressor = zlib.compressobj(wbits=(16 + zlib.MAX_WBITS))
         compressed = base64.b64encode(
             struct.pack("<L", len(insCodesList))
@@ -47,52 +238,33 @@ class TSEClient:
             + compressor.flush()
         )
 
-        url = "http://service.tsetmc.com/WebService/TseClient.asmx"
+        body = '<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema"><soap:Body><DecompressAndGetInsturmentClosingPrice xmlns="http://tsetmc.com/"><insCodes>{}</insCodes></DecompressAndGetInsturmentClosingPrice></soap:Body></soap:Envelope>'
 
         headers = {
-            "User-Agent": "Mozilla/4.0 (compatible; MSIE 6.0; MS Web Services Client Protocol 2.0.50727.9151)",
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": '"http://tsetmc.com/DecompressAndGetInsturmentClosingPrice"',
-            "Connection": "close",
+            "Accept-Encoding": "gzip, deflate",
         }
 
-        body = '<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema"><soap:Body><DecompressAndGetInsturmentClosingPrice xmlns="http://tsetmc.com/"><insCodes>{}</insCodes></DecompressAndGetInsturmentClosingPrice></soap:Body></soap:Envelope>'
-
-        response = requests.post(
-            url, data=body.format(compressed.decode("ascii")), headers=headers
+        return (
+            "DecompressAndGetInsturmentClosingPrice",
+            body.format(compressed.decode("ascii")),
+            headers,
         )
-        data = ""
-        if response.status_code == 200:
-            soup = bs4.BeautifulSoup(response.text, "xml")
-            tag = soup.find("DecompressAndGetInsturmentClosingPriceResult")
-            if tag is not None:
-                data = tag.text
-        return data
 
-    def LastPossibleDeven():
-        url = "http://service.tsetmc.com/WebService/TseClient.asmx"
+    def LastPossibleDeven(self):
+        return self._soap(*self._last_possible_deven_request())
 
+    @staticmethod
+    def _last_possible_deven_request():
         headers = {
-            "User-Agent": "Mozilla/4.0 (compatible; MSIE 6.0; MS Web Services Client Protocol 2.0.50727.9151)",
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": '"http://tsetmc.com/LastPossibleDeven"',
             "Expect": "100-continue",
             "Accept-Encoding": "gzip, deflate",
-            "Connection": "close",
         }
 
         body = '<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema"><soap:Body><LastPossibleDeven xmlns="http://tsetmc.com/" /></soap:Body></soap:Envelope>'
 
-        response = requests.post(url, data=body, headers=headers)
-        if response.status_code == 200:
-            soup = bs4.BeautifulSoup(response.text, "xml")
-            tag = soup.find("LastPossibleDevenResult")
-            data = ""
-            if tag is not None:
-                data = tag.text
-        return data
+        return "LastPossibleDeven", body, headers
 
-    def InstrumentAndShare(InsLastDate: str = "0", ShareLastID: int = 0):
+    def InstrumentAndShare(self, InsLastDate: str = "0", ShareLastID: int = 0):
         """
         
 
@@ -116,29 +288,24 @@ class TSEClient:
             decimal NumberOfShareOld
             
         """
-        url = "http://service.tsetmc.com/WebService/TseClient.asmx"
+        return self._soap(
+            *self._instrument_and_share_request(InsLastDate, ShareLastID)
+        )
 
+    @staticmethod
+    def _instrument_and_share_request(InsLastDate, ShareLastID):
         headers = {
-            "User-Agent": "Mozilla/4.0 (compatible; MSIE 6.0; MS Web Services Client Protocol 2.0.50727.9151)",
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": '"http://tsetmc.com/InstrumentAndShare"',
             "Expect": "100-continue",
             "Accept-Encoding": "gzip, deflate",
-            "Connection": "close",
         }
 
         body = '<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema"><soap:Body><InstrumentAndShare xmlns="http://tsetmc.com/"><DEven>{}</DEven><LastID>{}</LastID></InstrumentAndShare></soap:Body></soap:Envelope>'
 
-        response = requests.post(
-            url, data=body.format(InsLastDate, ShareLastID), headers=headers
+        return (
+            "InstrumentAndShare", body.format(InsLastDate, ShareLastID), headers
         )
-        if response.status_code == 200:
-            soup = bs4.BeautifulSoup(response.text, "xml")
-            tag = soup.find("InstrumentAndShareResult")
-            data = tag.text if tag else ""
-        return data
 
-    def Instrument(InsLastDate: str = "0"):
+    def Instrument(self, InsLastDate: str = "0"):
         """
         fetch list of tse instruments
 
@@ -173,22 +340,142 @@ class TSEClient:
             string YVal
 
         """
-        url = "http://service.tsetmc.com/WebService/TseClient.asmx"
+        return self._soap(*self._instrument_request(InsLastDate))
 
+    @staticmethod
+    def _instrument_request(InsLastDate):
         headers = {
-            "User-Agent": "Mozilla/4.0 (compatible; MSIE 6.0; MS Web Services Client Protocol 2.0.50727.9151)",
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": '"http://tsetmc.com/Instrument"',
             "Expect": "100-continue",
             "Accept-Encoding": "gzip, deflate",
-            "Connection": "close",
         }
 
         body = '<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema"><soap:Body><Instrument xmlns="http://tsetmc.com/"><DEven>{}</DEven></Instrument></soap:Body></soap:Envelope>'
 
-        response = requests.post(url, data=body.format(InsLastDate), headers=headers)
-        if response.status_code == 200:
-            soup = bs4.BeautifulSoup(response.text, "xml")
-            tag = soup.find("InstrumentResult")
-            data = tag.text if tag else ""
-        return data
+        return "Instrument", body.format(InsLastDate), headers
+
+
+class AsyncTSEClient:
+    """
+    Asyncio twin of TSEClient based on aiohttp
+
+    Parameters are the same as TSEClient except for
+
+    session : aiohttp.ClientSession, default None
+        Session to be used. A new session is created on first request
+        in the running event loop.
+    limit : int, default 10
+        Maximum number of requests in flight at the same time.
+    """
+
+    _count_request = TSEClient._count_request
+    _retry_settings = TSEClient._retry_settings
+
+    url = TSEClient.url
+
+    def __init__(
+        self, retry_count=3, pause=0.1, session=None, pause_multiplier=2.5,
+        limit=10, metrics=None, options=None,
+    ):
+        self.session = session
+        self.retry_count = retry_count
+        self.pause = pause
+        self.pause_multiplier = pause_multiplier
+        self.limit = limit
+        self.metrics = Metrics() if metrics is None else metrics
+        self.options = options
+        self._semaphore = None
+        self._semaphoreLimit = None
+        self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None and self._loop is not None:
+            await self.session.close()
+        self.session = None
+        self._loop = None
+
+    def _prepare(self):
+        """Bind session and in-flight limit to the running event loop"""
+        aiohttp = _aiohttp()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self.session is None or self._loop is not None:
+                self.session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=max(1, self.limit))
+                )
+            self._loop = loop
+            self._semaphore = None
+        if self._semaphore is None or self._semaphoreLimit != self.limit:
+            self._semaphore = asyncio.Semaphore(max(1, self.limit))
+            self._semaphoreLimit = self.limit
+
+    async def _request(self, method, url, read=None, **kwargs):
+        """
+        Send request and retry with laddered pause until it succeeds
+
+        Returns text of response, or await read(response) when read is
+        given. Raises RemoteDataError when all of retries are failed.
+        """
+        self._prepare()
+        aiohttp = _aiohttp()
+        retry_count, pause = self._retry_settings()
+        last_error = ""
+        for attempt in range(max(0, retry_count) + 1):
+            self._count_request(attempt, kwargs.get("data"))
+            try:
+                async with self._semaphore:
+                    async with self.session.request(method, url, **kwargs) as response:
+                        if response.status == 200:
+                            if read is None:
+                                return await response.text()
+                            return await read(response)
+                        text = await response.text()
+                last_error = f"HTTP {response.status}: {text[:200]}"
+            except (
+                aiohttp.ClientError, OSError, asyncio.TimeoutError, ET.ParseError
+            ) as e:
+                last_error = str(e)
+            await asyncio.sleep(pause)
+            # Increase time between subsequent requests
+            pause *= self.pause_multiplier
+        msg = f"Unable to read URL: {url}"
+        if last_error:
+            msg += f"\nResponse Text:\n{last_error}"
+        raise RemoteDataError(msg)
+
+    async def _soap(self, action, body, headers=None):
+        with self.metrics.stage("request", action=action):
+            return await self._request(
+                "POST",
+                self.url,
+                read=lambda response: _SoapResult.aread(
+                    response, action, self.metrics
+                ),
+                data=body,
+                headers=_soap_headers(action, headers),
+            )
+
+    async def DecompressAndGetInsturmentClosingPrice(self, insCodesList: str):
+        """Async version of TSEClient.DecompressAndGetInsturmentClosingPrice"""
+        if not insCodesList:
+            return ""
+        return await self._soap(*TSEClient._closing_price_request(insCodesList))
+
+    async def LastPossibleDeven(self):
+        """Async version of TSEClient.LastPossibleDeven"""
+        return await self._soap(*TSEClient._last_possible_deven_request())
+
+    async def InstrumentAndShare(self, InsLastDate: str = "0", ShareLastID: int = 0):
+        """Async version of TSEClient.InstrumentAndShare"""
+        return await self._soap(
+            *TSEClient._instrument_and_share_request(InsLastDate, ShareLastID)
+        )
+
+    async def Instrument(self, InsLastDate: str = "0"):
+        """Async version of TSEClient.Instrument"""
+        return await self._soap(*TSEClient._instrument_request(InsLastDate))